@@ -3,42 +3,267 @@ Animal classification module using a pre-trained Keras model.
 Now includes database integration.
 """
 
+import contextlib
+import functools
 import os
+import tempfile
 import time
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 
 # Suppress TensorFlow warnings (must be set before importing tensorflow)
 os.environ["TF_CPP_MIN_LOG_LEVEL"] = "3"
 os.environ["TF_ENABLE_ONEDNN_OPTS"] = "0"
+os.environ["TF_XLA_FLAGS"] = "--tf_xla_auto_jit=2"
 
 # pylint: disable=wrong-import-position,import-error,no-name-in-module
 import tensorflow as tf
 from tensorflow.keras.models import load_model
 from PIL import Image, ImageOps
 import numpy as np
-from dotenv import load_dotenv
-from db_handler import DatabaseHandler
+from bson import ObjectId
+from db_handler import DatabaseHandler, load_env
+
+try:
+    from turbojpeg import TurboJPEG, TJPF_RGB
+except ImportError:  # PyTurboJPEG is optional; PIL decodes JPEGs without it
+    TurboJPEG = TJPF_RGB = None
 
 # pylint: enable=wrong-import-position,import-error,no-name-in-module
 
 tf.get_logger().setLevel("ERROR")
 np.set_printoptions(suppress=True)
 
+# Number of highest-scoring classes reported in all_predictions
+TOP_K = 5
+
+# Side length of the square model input
+INPUT_SIZE = 224
+
+
+def _load_turbojpeg():
+    """
+    Create a TurboJPEG decoder if PyTurboJPEG and libturbojpeg are installed.
+
+    Returns:
+        TurboJPEG instance, or None to fall back to PIL
+    """
+    if TurboJPEG is None:
+        return None
+    try:
+        return TurboJPEG()
+    except (OSError, RuntimeError) as error:
+        print(f"✗ libturbojpeg not available, decoding JPEGs with PIL: {error}")
+        return None
+
+
+_JPEG = _load_turbojpeg()
+
+
+def _decode_jpeg(image_path):
+    """
+    Decode a JPEG with libturbojpeg, downscaling during the decode.
+
+    Uses the largest DCT scaling factor that keeps both sides at least
+    INPUT_SIZE pixels, so ImageOps.fit only has a small resize left.
+
+    Args:
+        image_path: Path to the JPEG file
+
+    Returns:
+        PIL RGB image
+    """
+    with open(image_path, "rb") as jpeg_file:
+        buf = jpeg_file.read()
+    width, height, _, _ = _JPEG.decode_header(buf)
+    denominator = 1
+    while denominator < 8 and min(width, height) >= INPUT_SIZE * denominator * 2:
+        denominator *= 2
+    array = _JPEG.decode(buf, pixel_format=TJPF_RGB, scaling_factor=(1, denominator))
+    return Image.fromarray(array)
+
+
+def _convert_to_tflite(model_path, tflite_path, quantization="float16"):
+    """
+    Convert a Keras model file to a quantized TFLite FlatBuffer.
+
+    Args:
+        model_path: Path to the Keras model file
+        tflite_path: Destination path for the converted model
+        quantization: "float16" for float16 weights, or "int8" for
+            dynamic-range quantization (int8 weights, float input/output)
+    """
+    converter = tf.lite.TFLiteConverter.from_keras_model(
+        load_model(model_path, compile=False)
+    )
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    if quantization != "int8":
+        converter.target_spec.supported_types = [tf.float16]
+    flatbuffer = converter.convert()
+    with _replace_when_done(tflite_path) as tmp_path:
+        with open(tmp_path, "wb") as f:
+            f.write(flatbuffer)
+
+
+def _convert_to_onnx(model_path, onnx_path):
+    """
+    Convert a Keras model file to an ONNX graph with a dynamic batch size.
+
+    Args:
+        model_path: Path to the Keras model file
+        onnx_path: Destination path for the converted model
+    """
+    import tf2onnx  # pylint: disable=import-outside-toplevel,import-error
+
+    signature = [
+        tf.TensorSpec([None, INPUT_SIZE, INPUT_SIZE, 3], tf.float32, name="input")
+    ]
+    with _replace_when_done(onnx_path) as tmp_path:
+        tf2onnx.convert.from_keras(
+            load_model(model_path, compile=False),
+            input_signature=signature,
+            opset=15,
+            output_path=tmp_path,
+        )
+
+
+@contextlib.contextmanager
+def _replace_when_done(path):
+    """
+    Write a file under a temporary name and move it into place when done.
+
+    A crash part way through, or two workers converting at once, can then
+    never leave a truncated file at path.
+
+    Args:
+        path: Final path of the file
+
+    Yields:
+        Temporary path beside path to write to
+    """
+    fd, tmp_path = tempfile.mkstemp(
+        dir=os.path.dirname(path) or ".", prefix=".", suffix=os.path.splitext(path)[1]
+    )
+    os.close(fd)
+    try:
+        yield tmp_path
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    os.replace(tmp_path, path)
+
+
+def _converted_path(model_path, suffix):
+    """
+    Path where a converted copy of a Keras model file is cached.
+
+    Converted models sit next to the .h5 file unless MODEL_CACHE_DIR names
+    another directory, such as a volume that outlives the container. The
+    name includes the .h5 file's size and mtime, so replacing the model
+    makes it convert again instead of reusing the old conversion.
+
+    Args:
+        model_path: Path to the Keras model file
+        suffix: Extension of the converted model, e.g. ".onnx"
+
+    Returns:
+        Path of the converted model file
+    """
+    base = os.path.splitext(model_path)[0]
+    cache_dir = os.getenv("MODEL_CACHE_DIR")
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+        base = os.path.join(cache_dir, os.path.basename(base))
+    try:
+        stat = os.stat(model_path)
+    except OSError:
+        return base + suffix  # Nothing to convert; loading will fail anyway
+    return f"{base}-{stat.st_size:x}-{stat.st_mtime_ns:x}{suffix}"
+
+
+@functools.lru_cache(maxsize=4)
+def _load_cached(model_path):
+    """
+    Load a Keras model once per process.
+
+    Models are shared read-only between AnimalClassifier instances, which
+    is safe for inference.
+
+    Args:
+        model_path: Absolute path to the Keras model file
+
+    Returns:
+        Loaded Keras model
+    """
+    return load_model(model_path, compile=False)
+
+
+@functools.lru_cache(maxsize=8)
+def _read_labels(labels_path, mtime):  # pylint: disable=unused-argument
+    """
+    Read class labels once per process and file version.
+
+    Args:
+        labels_path: Absolute path to the labels file
+        mtime: Modification time of the file, so edits invalidate the cache
+
+    Returns:
+        Tuple of class names
+    """
+    with open(labels_path, "r", encoding="utf-8") as f:
+        return tuple(map(str.rstrip, f.read().splitlines()))
+
+
+@functools.lru_cache(maxsize=4)
+def _compile_forward(model):
+    """
+    Wrap a Keras model's forward pass in an XLA-compiled concrete function.
+
+    The function is traced once for a fixed float32 (N, 224, 224, 3) input
+    signature, so calls skip tf.function's signature matching and never
+    retrace. It is then run once with a dummy batch so the first real
+    prediction does not pay the compilation cost.
+
+    Args:
+        model: Loaded Keras model
+
+    Returns:
+        Compiled inference function, or None if XLA compilation failed
+    """
+    signature = tf.TensorSpec([None, INPUT_SIZE, INPUT_SIZE, 3], tf.float32)
+    try:
+        infer = tf.function(
+            lambda x: model(x, training=False),
+            jit_compile=True,
+            input_signature=[signature],
+        ).get_concrete_function()
+        infer(tf.zeros((1, INPUT_SIZE, INPUT_SIZE, 3)))
+    except Exception as error:  # pylint: disable=broad-exception-caught
+        print(f"✗ XLA compilation failed, running the model eagerly: {error}")
+        return None
+    return infer
+
 
-class AnimalClassifier:
+class AnimalClassifier:  # pylint: disable=too-many-instance-attributes
     """Classifier for identifying animals in images."""
 
-    def __init__(self, model_path=None, labels_path=None):
+    def __init__(
+        self,
+        model_path=None,
+        labels_path=None,
+        resample=Image.Resampling.BILINEAR,
+    ):
         """
         Initialize the classifier with a model and labels.
 
         Args:
             model_path: Path to the Keras model file
             labels_path: Path to the labels text file
+            resample: PIL filter used to resize images to the model input
         """
         # --- Additions ---
-        load_dotenv()
+        load_env()
         self.model_version = os.getenv("MODEL_VERSION", "v1.0")
+        self.backend = os.getenv("MODEL_BACKEND", "keras").lower()
         # --- End of additions ---
 
         if model_path is None:
@@ -48,18 +273,140 @@ class AnimalClassifier:
             base_path = os.path.join(os.path.dirname(__file__), "../models")
             labels_path = os.path.join(base_path, "labels.txt")
 
-        self.model = load_model(model_path, compile=False)
+        self.resample = resample
+        self._input_index = None
+        self._output_index = None
+        self._tflite_batch = 1
+        self._input_name = None
+        self._infer = None
+        if self.backend == "tflite":
+            self.model = self._load_tflite(model_path)
+        elif self.backend == "onnx":
+            self.model = self._load_onnx(model_path)
+        else:
+            self.model = _load_cached(os.path.realpath(model_path))
+            self._infer = _compile_forward(self.model)
         self.class_names = self._load_labels(labels_path)
 
+        # Reused by preprocess_image on every call; not safe to share
+        # one classifier between threads.
+        self._input_buf = np.empty((1, INPUT_SIZE, INPUT_SIZE, 3), dtype=np.float32)
+        # Grown on demand by predict_batch, same caveat
+        self._batch_buf = None
+        # Decodes predict_batch's images; kept for the classifier's lifetime
+        # so each batch does not pay for starting threads
+        self._executor = ThreadPoolExecutor(thread_name_prefix="image-decode")
+
         # inside __init__
         try:
-            self.db_handler = DatabaseHandler()
-            self.db_connected = self.db_handler.connect()
+            self.db_handler = DatabaseHandler.shared()
+            self.db_connected = self.db_handler.connected
         except ValueError:
             # Missing env variables → disable DB integration for tests
             self.db_handler = None
             self.db_connected = False
 
+        self._warm_up()
+
+    def _warm_up(self):
+        """
+        Run one dummy forward pass so the first real prediction hits warm
+        kernels and already-planned memory.
+
+        Skipped for the compiled Keras function, which _compile_forward
+        already ran once when it traced it.
+        """
+        if self._infer is not None:
+            return
+        try:
+            self._run_model(np.zeros((1, INPUT_SIZE, INPUT_SIZE, 3), dtype=np.float32))
+        except Exception as error:  # pylint: disable=broad-exception-caught
+            print(f"✗ Model warm-up failed: {error}")
+
+    def _load_tflite(self, model_path):
+        """
+        Load a TFLite interpreter, converting the Keras model on first use.
+
+        The converted model is cached as a .tflite file next to the .h5 file
+        or in MODEL_CACHE_DIR. TFLITE_QUANTIZATION picks float16 (default) or int8 weights.
+
+        Args:
+            model_path: Path to the Keras model file
+
+        Returns:
+            TFLite interpreter with tensors allocated
+        """
+        quantization = os.getenv("TFLITE_QUANTIZATION", "float16").lower()
+        suffix = "_int8.tflite" if quantization == "int8" else ".tflite"
+        tflite_path = _converted_path(model_path, suffix)
+        if not os.path.exists(tflite_path):
+            _convert_to_tflite(model_path, tflite_path, quantization)
+
+        interpreter = tf.lite.Interpreter(
+            model_path=tflite_path, num_threads=os.cpu_count()
+        )
+        interpreter.allocate_tensors()
+        self._input_index = interpreter.get_input_details()[0]["index"]
+        self._output_index = interpreter.get_output_details()[0]["index"]
+        return interpreter
+
+    def _load_onnx(self, model_path):
+        """
+        Load an ONNX Runtime session, converting the Keras model on first use.
+
+        The converted model is cached as a .onnx file next to the .h5 file
+        or in MODEL_CACHE_DIR.
+
+        Args:
+            model_path: Path to the Keras model file
+
+        Returns:
+            ONNX Runtime inference session on the CPU provider
+        """
+        import onnxruntime  # pylint: disable=import-outside-toplevel,import-error
+
+        onnx_path = _converted_path(model_path, ".onnx")
+        if not os.path.exists(onnx_path):
+            _convert_to_onnx(model_path, onnx_path)
+
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = (
+            onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        )
+        options.intra_op_num_threads = os.cpu_count()
+        session = onnxruntime.InferenceSession(
+            onnx_path, sess_options=options, providers=["CPUExecutionProvider"]
+        )
+        self._input_name = session.get_inputs()[0].name
+        return session
+
+    def _run_model(self, data):
+        """
+        Run a forward pass on preprocessed image data.
+
+        Args:
+            data: Preprocessed image array
+
+        Returns:
+            Array of class probabilities
+        """
+        if self.backend == "tflite":
+            if len(data) != self._tflite_batch:
+                # Resizing re-plans the interpreter's memory, so it is only
+                # done when the batch size changes
+                self.model.resize_tensor_input(self._input_index, data.shape)
+                self.model.allocate_tensors()
+                self._tflite_batch = len(data)
+            self.model.set_tensor(self._input_index, data)
+            self.model.invoke()
+            return self.model.get_tensor(self._output_index)
+        if self.backend == "onnx":
+            return self.model.run(None, {self._input_name: data})[0]
+        if self._infer is not None:
+            return np.asarray(self._infer(tf.constant(data)))
+        # Calling the model directly skips model.predict's tf.data machinery
+        return np.asarray(self.model(tf.constant(data), training=False))
+
     def _load_labels(self, labels_path):
         """
         Load class labels from file.
@@ -68,10 +415,35 @@ class AnimalClassifier:
             labels_path: Path to labels file
 
         Returns:
-            List of class names
+            Tuple of class names
         """
-        with open(labels_path, "r", encoding="utf-8") as f:
-            return [line.strip() for line in f.readlines()]
+        labels_path = os.path.realpath(labels_path)
+        return _read_labels(labels_path, os.path.getmtime(labels_path))
+
+    def _load_image_array(self, image_path):
+        """
+        Decode an image and fit it to the model's 224x224 RGB input.
+
+        Args:
+            image_path: Path to the image file
+
+        Returns:
+            uint8 array of shape (224, 224, 3)
+        """
+        image = None
+        if _JPEG is not None and image_path.lower().endswith((".jpg", ".jpeg")):
+            try:
+                image = _decode_jpeg(image_path)
+            except OSError:
+                pass  # Not a JPEG libturbojpeg handles (e.g. CMYK); try PIL
+        if image is None:
+            with Image.open(image_path) as source:
+                # Let libjpeg decode at the smallest DCT scale still >= 224x224
+                # (no-op for non-JPEG images)
+                source.draft("RGB", (INPUT_SIZE, INPUT_SIZE))
+                image = source.convert("RGB")
+        image = ImageOps.fit(image, (INPUT_SIZE, INPUT_SIZE), self.resample)
+        return np.asarray(image)
 
     def preprocess_image(self, image_path):
         """
@@ -81,22 +453,28 @@ class AnimalClassifier:
             image_path: Path to the image file
 
         Returns:
-            Preprocessed image array ready for prediction
+            Preprocessed image array ready for prediction. The array is a
+            buffer owned by the classifier and is overwritten on the next call.
         """
-        image = Image.open(image_path).convert("RGB")
-        # Using original ImageOps.fit method
-        image = ImageOps.fit(image, (224, 224), Image.Resampling.LANCZOS)
-        image_array = np.asarray(image)
-        normalized_image_array = (image_array.astype(np.float32) / 127.5) - 1
-        return np.expand_dims(normalized_image_array, axis=0)
-
-    def predict(self, image_path, save_to_db=True):
+        image_array = self._load_image_array(image_path)
+        # Scale into the preallocated buffer, then shift to [-1, 1] in place
+        np.multiply(
+            image_array,
+            np.float32(1 / 127.5),
+            out=self._input_buf[0],
+            casting="unsafe",
+        )
+        self._input_buf[0] -= 1.0
+        return self._input_buf
+
+    def predict(self, image_path, save_to_db=True, return_all_predictions=False):
         """
         Classify an animal in an image and optionally save to database.
 
         Args:
             image_path: Path to the image file
             save_to_db: Whether to save result to database
+            return_all_predictions: Whether to include the top-scoring classes
 
         Returns:
             Dictionary with classification results
@@ -106,38 +484,23 @@ class AnimalClassifier:
         try:
             #  Original preprocessing and prediction logic
             data = self.preprocess_image(image_path)
-            prediction = self.model.predict(data, verbose=0)
-            index = np.argmax(prediction)
+            scores = self._run_model(data)[0]
+            index = int(scores.argmax())
             class_name = self.class_names[index]
-            confidence_score = float(prediction[0][index])
+            confidence_score = scores.item(index)
 
             # --- Logic added ---
             processing_time_ms = int((time.time() - start_time) * 1000)
 
-            # Solved "Too many local variables"
-            image_id = (
-                f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_"
-                f"{os.path.basename(image_path)}"
+            result = self._build_result(
+                image_path, class_name, confidence_score, processing_time_ms
             )
-
-            result = {
-                "image_id": image_id,
-                "image_path": image_path,
-                "animal_type": class_name,  # Using variable name
-                "confidence": confidence_score,  # Using variable name
-                "processing_time_ms": processing_time_ms,
-                "model_version": self.model_version,
-                "all_predictions": {
-                    self.class_names[i]: float(prediction[0][i])
-                    for i in range(len(self.class_names))
-                },
-            }
+            if return_all_predictions:
+                result["all_predictions"] = self._top_predictions(scores)
 
             # Save to database if connected and requested
-            if save_to_db and self.db_connected:
-                # --- FIX: This line is now formatted to pass 'black' ---
-                db_id = self.db_handler.save_classification(classification_data=result)
-                result["db_id"] = str(db_id) if db_id else None
+            if save_to_db:
+                self._save_result(result)
 
             return result
 
@@ -149,6 +512,167 @@ class AnimalClassifier:
             # Return a structured error
             return {"image_path": image_path, "error": str(error)}
 
+    def predict_batch(
+        self, image_paths, batch_size=32, save_to_db=True, return_all_predictions=False
+    ):
+        """
+        Classify several images, running the model once per batch.
+
+        Images are decoded in a thread pool (PIL releases the GIL while
+        decoding) and stacked into a single (N, 224, 224, 3) input.
+
+        Args:
+            image_paths: List of image file paths
+            batch_size: Maximum number of images per model call
+            save_to_db: Whether to save results to database
+            return_all_predictions: Whether to include the top-scoring classes
+
+        Returns:
+            List of result dictionaries in the same order as image_paths.
+            Images that could not be read get an error dictionary instead.
+        """
+        results = []
+        for offset in range(0, len(image_paths), batch_size):
+            chunk = image_paths[offset : offset + batch_size]
+            results.extend(
+                self._predict_chunk(chunk, save_to_db, return_all_predictions)
+            )
+        return results
+
+    def _predict_chunk(self, image_paths, save_to_db, return_all_predictions):
+        """
+        Classify one batch of images for predict_batch.
+
+        Args:
+            image_paths: Image file paths in this batch
+            save_to_db: Whether to save results to database
+            return_all_predictions: Whether to include the top-scoring classes
+
+        Returns:
+            List of result dictionaries in the same order as image_paths
+        """
+        start_time = time.time()
+        arrays = list(self._executor.map(self._try_load_image_array, image_paths))
+        loaded = [i for i, array in enumerate(arrays) if isinstance(array, np.ndarray)]
+
+        results = [
+            {"image_path": path, "error": str(array)}
+            for path, array in zip(image_paths, arrays)
+        ]
+        if not loaded:
+            return results
+
+        scores = self._run_batch([arrays[i] for i in loaded])
+
+        # Model time is shared evenly across the batch
+        processing_time_ms = int((time.time() - start_time) * 1000 / len(loaded))
+        indexes = scores.argmax(axis=1).tolist()
+        for row, i in enumerate(loaded):
+            result = self._build_result(
+                image_paths[i],
+                self.class_names[indexes[row]],
+                scores.item(row, indexes[row]),
+                processing_time_ms,
+            )
+            if return_all_predictions:
+                result["all_predictions"] = self._top_predictions(scores[row])
+            if save_to_db:
+                self._save_result(result)
+            results[i] = result
+        return results
+
+    def _try_load_image_array(self, image_path):
+        """
+        Load an image for predict_batch without raising on bad files.
+
+        Args:
+            image_path: Path to the image file
+
+        Returns:
+            uint8 image array, or the exception raised while reading it
+        """
+        try:
+            return self._load_image_array(image_path)
+        except (IOError, ValueError) as error:
+            print(f"✗ Error classifying image: {error}")
+            return error
+
+    def _run_batch(self, arrays):
+        """
+        Normalize a list of decoded images and run them as one batch.
+
+        Args:
+            arrays: uint8 image arrays of shape (224, 224, 3)
+
+        Returns:
+            Array of class probabilities with one row per image
+        """
+        # Normalize straight into a reused float32 buffer instead of
+        # np.stack + astype, which allocate two full-batch temporaries
+        if self._batch_buf is None or len(self._batch_buf) < len(arrays):
+            self._batch_buf = np.empty(
+                (len(arrays), INPUT_SIZE, INPUT_SIZE, 3), dtype=np.float32
+            )
+        data = self._batch_buf[: len(arrays)]
+        for row, array in zip(data, arrays):
+            np.multiply(array, np.float32(1 / 127.5), out=row, casting="unsafe")
+        data -= 1.0
+        return self._run_model(data)
+
+    def _build_result(self, image_path, class_name, confidence, processing_time_ms):
+        """
+        Build the result dictionary for one classified image.
+
+        Args:
+            image_path: Path to the image file
+            class_name: Predicted class name
+            confidence: Score of the predicted class
+            processing_time_ms: Time spent classifying the image
+
+        Returns:
+            Dictionary with classification results
+        """
+        # ObjectId embeds the creation time and is unique within a second
+        image_id = f"{ObjectId()}_{os.path.basename(image_path)}"
+
+        return {
+            "image_id": image_id,
+            "image_path": image_path,
+            "animal_type": class_name,
+            "confidence": confidence,
+            "processing_time_ms": processing_time_ms,
+            "model_version": self.model_version,
+        }
+
+    def _save_result(self, result):
+        """
+        Save a result to the database if connected and record its id.
+
+        Args:
+            result: Result dictionary, updated in place with db_id
+        """
+        if self.db_connected:
+            db_id = self.db_handler.save_classification(classification_data=result)
+            result["db_id"] = str(db_id) if db_id else None
+
+    def _top_predictions(self, scores):
+        """
+        Map the TOP_K highest-scoring class names to their scores.
+
+        Args:
+            scores: 1-D array of class probabilities
+
+        Returns:
+            Dictionary of class name to score, highest score first
+        """
+        if len(scores) > TOP_K:
+            top = np.argpartition(-scores, TOP_K)[:TOP_K]
+        else:
+            top = np.arange(len(scores))
+        probs = scores.tolist()
+        top = top[np.argsort(-scores[top])].tolist()
+        return {self.class_names[i]: probs[i] for i in top}
+
     # --- Methods added ---
 
     def get_stats(self):
@@ -159,8 +683,10 @@ class AnimalClassifier:
 
     def close(self):
         """Clean up resources."""
+        self._executor.shutdown(wait=True)
         if self.db_handler:
-            self.db_handler.close()
+            # Other classifiers may still hold the shared handler
+            self.db_handler.release()
 
 
 def main():
@@ -2,129 +2,487 @@
 Database handler for storing classification results in MongoDB.
 """
 
+import functools
+import logging
 import os
-from datetime import datetime
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
 from dotenv import load_dotenv
 import pymongo
+from bson.errors import BSONError
 from bson.objectid import ObjectId
-from bson.errors import InvalidId
 
+logger = logging.getLogger(__name__)
 
-class DatabaseHandler:
+# A batch is written once it holds this many documents...
+WRITE_BATCH_SIZE = 100
+# ...or this many seconds after its first document was queued
+WRITE_FLUSH_INTERVAL = 0.05
+# Batches inserted concurrently, so one slow round-trip does not hold up the next
+WRITE_WORKERS = 8
+
+# Compound index covering every field read by get_classification_stats
+STATS_INDEX = "stats_cover"
+# Same, led by timestamp, for stats over a time window; its timestamp prefix
+# also serves get_recent_classifications' newest-first sort
+WINDOW_STATS_INDEX = "ts_stats_cover"
+# IndexOptionsConflict and IndexKeySpecsConflict: an index of the same name
+# already exists with other options, so ours is skipped rather than rebuilt
+INDEX_CONFLICT_CODES = frozenset({85, 86})
+
+# Sentinels telling the writer thread to write its batch now / to exit
+_FLUSH = object()
+_STOP = object()
+
+
+@functools.lru_cache(maxsize=1)
+def load_env():
+    """
+    Load the .env file into os.environ once per process.
+
+    Later calls return immediately instead of searching for and parsing
+    the file again.
+    """
+    load_dotenv()
+
+
+@functools.lru_cache(maxsize=4096)
+def _to_object_id(value):
+    """
+    Parse a hex string into an ObjectId, memoized for repeated lookups.
+
+    Args:
+        value: 24-character hex string
+
+    Returns:
+        The parsed ObjectId
+
+    Raises:
+        bson.errors.InvalidId: If value is not a valid ObjectId string
+    """
+    return ObjectId(value)
+
+
+class DatabaseHandler:  # pylint: disable=too-many-instance-attributes
     """Handles MongoDB operations for animal classifications."""
 
+    # Process-wide handler returned by shared(), and how many holders it has
+    _shared = None
+    _shared_refs = 0
+    _shared_lock = threading.Lock()
+
     def __init__(self):
-        """Initialize database connection."""
-        load_dotenv()
+        """
+        Connect to the database named by MONGO_URI and MONGO_DBNAME.
+
+        A failed connection does not raise; check the connected attribute.
+
+        Raises:
+            ValueError: If the environment variables are missing
+        """
+        load_env()
 
-        self.mongo_uri = os.getenv("MONGO_URI")
-        self.db_name = os.getenv("MONGO_DBNAME")
+        mongo_uri = os.getenv("MONGO_URI")
+        db_name = os.getenv("MONGO_DBNAME")
 
-        if not self.mongo_uri or not self.db_name:
+        if not mongo_uri or not db_name:
             raise ValueError("Missing MONGO_URI or MONGO_DBNAME environment variables")
 
         self.client = None
         self.db = None
         self.classifications = None
+        # Names of the indexes _ensure_indexes built; only these are hinted
+        self._indexes = set()
+
+        # Classifications are batched by a background writer thread and
+        # inserted by a small thread pool
+        self._queue = queue.Queue(maxsize=1024)
+        self._writer = None
+        self._pool = None
+        self._in_flight = None
+
+        self.connected = self._connect(mongo_uri, db_name)
 
-    def connect(self):
+    @classmethod
+    def shared(cls):
         """
-        Establishes connection to MongoDB.
+        Return the process-wide handler, connecting it on first use.
+
+        Sharing one handler means repeated AnimalClassifier() constructions
+        reuse one MongoClient pool instead of opening a new one each time. A
+        handler whose connection failed is returned but not kept, so the
+        next call retries. Each caller gives the handler up with release().
+
+        Returns:
+            DatabaseHandler instance
+
+        Raises:
+            ValueError: If the MongoDB environment variables are missing
+        """
+        with cls._shared_lock:
+            if cls._shared is None:
+                handler = cls()
+                if not handler.connected:
+                    return handler
+                cls._shared = handler
+            cls._shared_refs += 1
+            return cls._shared
+
+    def release(self):
+        """
+        Give up a handler obtained from shared().
+
+        The shared handler is only closed once its last holder releases it;
+        any other handler is closed straight away.
+        """
+        with type(self)._shared_lock:
+            if type(self)._shared is self:
+                type(self)._shared_refs -= 1
+                if type(self)._shared_refs > 0:
+                    return
+        self.close()
+
+    def _connect(self, mongo_uri, db_name):
+        """
+        Create the client, build the indexes and start the writer thread.
+
+        Args:
+            mongo_uri: MongoDB connection string
+            db_name: Name of the database holding the classifications
+
+        Returns:
+            True if the server was reached, False otherwise
         """
         try:
-            self.client = pymongo.MongoClient(self.mongo_uri)
-            self.db = self.client[self.db_name]
-            self.classifications = self.db.classifications
-            # Test connection
-            self.client.server_info()
-            print("✓ Connected to MongoDB")
+            self.client = pymongo.MongoClient(
+                mongo_uri,
+                maxPoolSize=200,
+                minPoolSize=10,
+                maxIdleTimeMS=300_000,
+                waitQueueTimeoutMS=2_000,
+                retryWrites=True,
+                w="majority",
+                appname="ml-client",
+                serverSelectionTimeoutMS=2_000,
+            )
+            self.db = self.client[db_name]
+            # Classifications are re-creatable ML output, so inserts only
+            # wait for the primary's in-memory ack (no journal fsync, no
+            # majority) instead of the client's w="majority" default
+            self.classifications = self.db.get_collection(
+                "classifications", write_concern=pymongo.WriteConcern(w=1, j=False)
+            )
+            # The index builds are the first round-trip and double as the
+            # connection test, so no separate server_info() probe is needed
+            self._ensure_indexes()
+            logger.info("✓ Connected to MongoDB")
+            self._start_writer()
             return True
         except pymongo.errors.ConnectionFailure as error:
-            print(f"✗ Failed to connect to MongoDB: {error}")
+            logger.error("✗ Failed to connect to MongoDB: %s", error)
+            return False
+        except pymongo.errors.OperationFailure as error:
+            # e.g. bad credentials or a user without access to the database
+            logger.error("✗ MongoDB rejected the connection: %s", error)
             return False
 
-    def save_classification(self, classification_data):
+    def _ensure_indexes(self):
+        """
+        Create the indexes used by the read queries (idempotent).
+
+        Each index that is built is recorded in _indexes; one that conflicts
+        with an existing index is logged and the queries run without hinting it.
+
+        Raises:
+            pymongo.errors.ConnectionFailure: If the server is unreachable
+            pymongo.errors.OperationFailure: If the server refuses the build,
+                e.g. for failed authentication or missing privileges
+        """
+        indexes = {
+            # Covers the stats aggregation, and serves animal_type lookups
+            STATS_INDEX: [
+                ("animal_type", 1),
+                ("confidence", 1),
+                ("processing_time_ms", 1),
+            ],
+            WINDOW_STATS_INDEX: [
+                ("timestamp", -1),
+                ("animal_type", 1),
+                ("confidence", 1),
+                ("processing_time_ms", 1),
+            ],
+        }
+        for name, keys in indexes.items():
+            try:
+                self.classifications.create_index(keys, name=name)
+                self._indexes.add(name)
+            except pymongo.errors.OperationFailure as error:
+                if error.code not in INDEX_CONFLICT_CODES:
+                    raise
+                logger.error("✗ Error creating index %s: %s", name, error)
+
+    def _start_writer(self):
+        """Start the background thread that inserts queued classifications."""
+        if self._writer is None:
+            self._pool = ThreadPoolExecutor(
+                max_workers=WRITE_WORKERS, thread_name_prefix="mongo-save"
+            )
+            # The pool's own work queue is unbounded; holding the writer back
+            # while every worker is busy lets a slow server fill the bounded
+            # queue instead, so save_classification reports it full
+            self._in_flight = threading.BoundedSemaphore(WRITE_WORKERS)
+            self._writer = threading.Thread(
+                target=self._write_loop, name="classification-writer", daemon=True
+            )
+            self._writer.start()
+
+    def _write_loop(self):
+        """Collect queued documents into batches and hand them to the pool."""
+        stopping = False
+        while not stopping:
+            docs, taken, stopping = self._collect_batch()
+            if docs:
+                # Released by _batch_done once the batch is written
+                self._in_flight.acquire()  # pylint: disable=consider-using-with
+                future = self._pool.submit(self._insert_batch, docs)
+                # Mark items done only once written, so flush() can wait on them
+                future.add_done_callback(lambda f, n=taken: self._batch_done(f, n))
+            else:
+                self._mark_done(taken)
+
+    def _batch_done(self, future, count):
+        """Log a batch that failed unexpectedly, then mark its items done."""
+        self._in_flight.release()
+        error = future.exception()
+        if error is not None:
+            logger.error("✗ Error saving classifications: %r", error)
+        self._mark_done(count)
+
+    def _mark_done(self, count):
+        """Mark count items taken from the queue as processed."""
+        for _ in range(count):
+            self._queue.task_done()
+
+    def _collect_batch(self):
         """
-        Save a classification result to the database.
+        Wait for a full batch, the flush interval, or a sentinel.
+
+        Returns:
+            Tuple of (documents, items taken from the queue, stop requested)
         """
+        item = self._queue.get()
+        docs = []
+        taken = 1
+        deadline = time.monotonic() + WRITE_FLUSH_INTERVAL
+        while item is not _STOP and item is not _FLUSH:
+            docs.append(item)
+            if len(docs) >= WRITE_BATCH_SIZE:
+                break
+            try:
+                item = self._queue.get(timeout=max(0, deadline - time.monotonic()))
+            except queue.Empty:
+                break
+            taken += 1
+        return docs, taken, item is _STOP
+
+    def _insert_batch(self, entries):
+        """
+        Build documents for a batch of queued classifications and insert them.
+        """
+        # One timestamp per batch; batches span at most WRITE_FLUSH_INTERVAL
+        now = datetime.now(timezone.utc)
+        docs = [self._build_document(entry, now) for entry in entries]
+        docs = [doc for doc in docs if doc is not None]
+        if not docs:
+            return
         try:
-            doc = {
+            self.classifications.insert_many(
+                docs, ordered=False, bypass_document_validation=True
+            )
+            logger.debug("✓ Saved %d classification(s)", len(docs))
+        except (pymongo.errors.PyMongoError, BSONError) as error:
+            logger.error("✗ Error saving classifications: %s", error)
+
+    @staticmethod
+    def _build_document(entry, timestamp):
+        """
+        Build the MongoDB document for a queued classification.
+
+        Args:
+            entry: Tuple of (ObjectId, classification data)
+            timestamp: UTC time to record for the classification
+
+        Returns:
+            Document to insert, or None if the classification data is invalid
+        """
+        doc_id, classification_data = entry
+        try:
+            return {
+                "_id": doc_id,
                 "image_id": classification_data["image_id"],
                 "image_path": classification_data["image_path"],
                 "animal_type": classification_data["animal_type"],
+                # NumPy scalars are not BSON-encodable
                 "confidence": float(classification_data["confidence"]),
-                "timestamp": datetime.utcnow(),
+                "timestamp": timestamp,
                 "processing_time_ms": int(classification_data["processing_time_ms"]),
                 "model_version": classification_data.get("model_version", "v1.0"),
             }
+        except KeyError as error:
+            logger.error("✗ Error saving classification: missing %s", error)
+            return None
+        except (TypeError, ValueError) as error:
+            logger.error("✗ Error saving classification: %s", error)
+            return None
 
-            result = self.classifications.insert_one(doc)
-            print(
-                f"✓ Saved: {doc['image_id']} -> {doc['animal_type']} "
-                f"({doc['confidence']:.2%})"
-            )
-            return result.inserted_id
+    def save_classification(self, classification_data):
+        """
+        Queue a classification result to be saved to the database.
+
+        Only a reference to classification_data is queued; the background
+        writer thread builds and inserts the document, so this returns
+        without waiting for MongoDB. The fields that are saved must not be
+        changed afterwards.
 
-        except (pymongo.errors.PyMongoError, ValueError, TypeError, KeyError) as error:
-            print(f"✗ Error saving classification: {error}")
+        Returns:
+            The ObjectId assigned to the document, or None if it was not queued
+        """
+        if self._writer is None:
+            logger.error("✗ Error saving classification: handler is closed")
+            return None
+        doc_id = ObjectId()
+        try:
+            self._queue.put_nowait((doc_id, classification_data))
+        except queue.Full:
+            logger.error("✗ Error saving classification: write queue is full")
             return None
+        return doc_id
 
     def get_recent_classifications(self, limit=10):
         """
         Retrieve recent classification results.
+
+        Args:
+            limit: Maximum number of classifications to return
+
+        Returns:
+            Cursor over the newest classifications, streamed in batches
+            (wrap in list() to materialize), or [] if limit is not positive
+
+        Raises:
+            pymongo.errors.PyMongoError: While iterating, if the query fails;
+                the cursor only contacts the server once iterated
         """
-        try:
-            results = self.classifications.find().sort("timestamp", -1).limit(limit)
-            return list(results)
-        except pymongo.errors.PyMongoError as error:
-            print(f"✗ Error retrieving classifications: {error}")
+        # limit(0) means "no limit" to MongoDB; never send that by accident
+        if limit <= 0:
             return []
+        # Only the fields callers display, so less BSON crosses the wire
+        projection = {
+            "_id": 0,
+            "image_id": 1,
+            "animal_type": 1,
+            "confidence": 1,
+            "timestamp": 1,
+        }
+        cursor = (
+            self.classifications.find({}, projection=projection)
+            .sort("timestamp", -1)
+            .limit(limit)
+            .batch_size(min(limit, 100))
+        )
+        if WINDOW_STATS_INDEX in self._indexes:
+            cursor = cursor.hint(WINDOW_STATS_INDEX)
+        return cursor
 
     def get_classification_by_id(self, classification_id):
         """
         Retrieve a specific classification by its MongoDB ID.
         """
+        if isinstance(classification_id, str):
+            # Reject malformed ids without a round-trip to the server
+            if not ObjectId.is_valid(classification_id):
+                logger.error("✗ Invalid classification id: %s", classification_id)
+                return None
+            classification_id = _to_object_id(classification_id)
         try:
-            if isinstance(classification_id, str):
-                classification_id = ObjectId(classification_id)
             return self.classifications.find_one({"_id": classification_id})
-        except (pymongo.errors.PyMongoError, InvalidId, ValueError) as error:
-            print(f"✗ Error retrieving classification: {error}")
+        except pymongo.errors.PyMongoError as error:
+            logger.error("✗ Error retrieving classification: %s", error)
             return None
 
-    def get_classification_stats(self):
+    def get_classification_stats(self, since=None):
         """
         Get statistics about classifications.
+
+        Args:
+            since: Optional datetime; only classifications from this time on
+                are counted
+
+        Returns:
+            Dictionary of totals, per-type counts and averages
         """
+        # The leading stage plus the $project let the planner answer from
+        # one index alone (a covered IXSCAN) instead of scanning documents
+        if since is None:
+            first_stage = {"$sort": {"animal_type": 1}}
+            index = STATS_INDEX
+        else:
+            first_stage = {"$match": {"timestamp": {"$gte": since}}}
+            index = WINDOW_STATS_INDEX
         try:
-            total = self.classifications.count_documents({})
-
-            # Count by animal type
+            # Count, per-type breakdown and overall averages in one round trip
             pipeline = [
+                first_stage,
                 {
-                    "$group": {
-                        "_id": "$animal_type",
-                        "count": {"$sum": 1},
-                        "avg_confidence": {"$avg": "$confidence"},
+                    "$project": {
+                        "_id": 0,
+                        "animal_type": 1,
+                        "confidence": 1,
+                        "processing_time_ms": 1,
                     }
                 },
-                {"$sort": {"count": -1}},
-            ]
-            by_type = list(self.classifications.aggregate(pipeline))
-
-            # Overall averages
-            avg_pipeline = [
                 {
-                    "$group": {
-                        "_id": None,
-                        "avg_confidence": {"$avg": "$confidence"},
-                        "avg_processing_time": {"$avg": "$processing_time_ms"},
+                    "$facet": {
+                        "by_type": [
+                            {
+                                "$group": {
+                                    "_id": "$animal_type",
+                                    "count": {"$sum": 1},
+                                    "avg_confidence": {"$avg": "$confidence"},
+                                }
+                            },
+                            {"$sort": {"count": -1}},
+                        ],
+                        "overall": [
+                            {
+                                "$group": {
+                                    "_id": None,
+                                    "count": {"$sum": 1},
+                                    "avg_confidence": {"$avg": "$confidence"},
+                                    "avg_processing_time": {
+                                        "$avg": "$processing_time_ms"
+                                    },
+                                }
+                            }
+                        ],
                     }
-                }
+                },
             ]
-            avg_result = list(self.classifications.aggregate(avg_pipeline))
-            avg_confidence = avg_result[0]["avg_confidence"] if avg_result else 0
-            avg_processing = avg_result[0]["avg_processing_time"] if avg_result else 0
+            # Hinting an index that was never built would fail every call
+            options = {"hint": index} if index in self._indexes else {}
+            cursor = self.classifications.aggregate(
+                pipeline, allowDiskUse=False, **options
+            )
+            facets = next(iter(cursor), {})
+
+            by_type = facets.get("by_type", [])
+            overall = facets.get("overall")
+            total = overall[0]["count"] if overall else 0
+            avg_confidence = overall[0]["avg_confidence"] if overall else 0
+            avg_processing = overall[0]["avg_processing_time"] if overall else 0
 
             return {
                 "total_classifications": total,
@@ -140,7 +498,7 @@ class DatabaseHandler:
                 "average_processing_time_ms": avg_processing,
             }
         except pymongo.errors.PyMongoError as error:
-            print(f"✗ Error getting statistics: {error}")
+            logger.error("✗ Error getting statistics: %s", error)
             return {
                 "total_classifications": 0,
                 "by_animal_type": [],
@@ -148,8 +506,23 @@ class DatabaseHandler:
                 "average_processing_time_ms": 0,
             }
 
+    def flush(self):
+        """Block until every queued classification has been written."""
+        if self._writer is not None:
+            self._queue.put(_FLUSH)
+            self._queue.join()
+
     def close(self):
-        """Close database connection."""
+        """Write pending classifications and close database connection."""
+        if self._writer is not None:
+            self._queue.put(_STOP)
+            self._writer.join()
+            self._writer = None
+            self._pool.shutdown(wait=True)
         if self.client:
             self.client.close()
-            print("✓ Database connection closed")
+            logger.info("✓ Database connection closed")
+        with type(self)._shared_lock:
+            if type(self)._shared is self:
+                type(self)._shared = None
+                type(self)._shared_refs = 0
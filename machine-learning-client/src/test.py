@@ -20,13 +20,45 @@ def main(image_path):
         image_path (str): Path to the image file
     """
     classifier = AnimalClassifier()
-    class_name, confidence_score = classifier.predict(image_path)
+    try:
+        class_name, confidence_score = classifier.predict(image_path)
+    finally:
+        # Writes the queued classification before the script exits
+        classifier.close()
     print(f"Class: {class_name}")
     print(f"Confidence: {confidence_score:.2f}")
 
 
+def classify_many(image_paths):
+    """
+    Run classification on several images, loading the model only once.
+
+    The images are classified together by AnimalClassifier.predict_batch.
+
+    Args:
+        image_paths (list): Paths to the image files
+    """
+    classifier = AnimalClassifier()
+    try:
+        results = classifier.predict_batch(image_paths)
+    finally:
+        # Writes the queued classifications before the script exits
+        classifier.close()
+    for result in results:
+        if "error" in result:
+            print(f"{result['image_path']}: error: {result['error']}")
+        else:
+            print(
+                f"{result['image_path']}: {result['animal_type']} "
+                f"({result['confidence']:.2f})"
+            )
+
+
 if __name__ == "__main__":
     if len(sys.argv) < 2:
-        print("Usage: python test.py <image_path>")
+        print("Usage: python test.py <image_path> [<image_path> ...]")
         sys.exit(1)
-    main(sys.argv[1])
+    if len(sys.argv) == 2:
+        main(sys.argv[1])
+    else:
+        classify_many(sys.argv[1:])
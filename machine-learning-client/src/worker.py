@@ -4,12 +4,16 @@ Continuously monitors the database for pending photo classifications
 and processes them using the AnimalClassifier.
 """
 
-# pylint: disable=logging-fstring-interpolation,broad-exception-caught,import-error
+# pylint: disable=broad-exception-caught,import-error
 
 import os
+import queue
+import signal
+import socket
 import time
 import logging
-from datetime import datetime
+import logging.handlers
+from datetime import datetime, timedelta
 from dotenv import load_dotenv
 import pymongo
 from classifier import AnimalClassifier  # ← FIXED: Remove duplicate imports
@@ -25,18 +29,50 @@ logger = logging.getLogger(__name__)
 # Load environment variables
 load_dotenv()
 
-
-class MLWorker:
+# Shortest wait between polls, used right after finding work
+MIN_POLL_INTERVAL = 0.25
+
+# The web app queues a job for every upload in this capped collection; a
+# tailable cursor waits up to JOB_AWAIT_MS inside MongoDB for the next one
+PHOTO_JOBS_SIZE = 1024 * 1024
+JOB_AWAIT_MS = 1000
+# Error code for a tailable cursor whose position was overwritten
+CAPPED_POSITION_LOST = 136
+# Error code for watch() on a server without change streams (standalone)
+CHANGE_STREAMS_UNSUPPORTED = 40573
+
+# Consecutive lost connections double the wait before retrying, up to this
+MAX_RETRY_DELAY = 60
+
+# A photo claimed longer ago than this by a worker that never finished it
+# goes back to pending
+CLAIM_TIMEOUT = timedelta(minutes=10)
+
+# Change stream events for photos that are (still) pending; the worker's own
+# done/failed updates don't match
+PENDING_CHANGES = [
+    {
+        "$match": {
+            "operationType": {"$in": ["insert", "replace", "update"]},
+            "fullDocument.status": "pending",
+        }
+    }
+]
+
+
+class MLWorker:  # pylint: disable=too-many-instance-attributes
     """Worker that processes pending photo classifications."""
 
-    def __init__(self, poll_interval=5):
+    def __init__(self, poll_interval=5, batch_size=32):
         """
         Initialize the ML worker.
 
         Args:
             poll_interval: Seconds to wait between database polls
+            batch_size: Maximum number of pending photos handled per poll
         """
         self.poll_interval = poll_interval
+        self.batch_size = batch_size
 
         # Connect to MongoDB
         self.mongo_uri = os.getenv("MONGO_URI")
@@ -45,19 +81,53 @@ class MLWorker:
         if not self.mongo_uri:
             raise ValueError("MONGO_URI environment variable is required")
 
-        logger.info(f"Connecting to MongoDB at {self.mongo_uri}")
+        logger.info("Connecting to MongoDB at %s", self.mongo_uri)
         self.client = pymongo.MongoClient(self.mongo_uri)
         self.db = self.client[self.db_name]
         self.photos_collection = self.db["photos"]
+        self.photo_jobs = self.db["photo_jobs"]
 
         # Test connection
         try:
             self.client.server_info()
             logger.info("✓ Connected to MongoDB successfully")
         except pymongo.errors.ServerSelectionTimeoutError as e:
-            logger.error(f"✗ Failed to connect to MongoDB: {e}")
+            logger.error("✗ Failed to connect to MongoDB: %s", e)
             raise
 
+        # Partial indexes cover only unfinished photos, so they stay small
+        # however many photos are done; one serves the pending lookup and
+        # the other two the stale-claim sweep, whose $or only avoids a
+        # collection scan when every branch has an index
+        try:
+            self.photos_collection.create_index(
+                [("status", pymongo.ASCENDING), ("_id", pymongo.ASCENDING)],
+                name="pending",
+                partialFilterExpression={"status": "pending"},
+            )
+            self.photos_collection.create_index(
+                [("claimed_at", pymongo.ASCENDING)],
+                name="processing_claimed_at",
+                partialFilterExpression={"status": "processing"},
+            )
+            self.photos_collection.create_index(
+                [("worker_id", pymongo.ASCENDING)],
+                name="processing_worker_id",
+                partialFilterExpression={"status": "processing"},
+            )
+        except pymongo.errors.PyMongoError as e:
+            logger.warning("Could not create the status indexes: %s", e)
+
+        try:
+            self.db.create_collection("photo_jobs", capped=True, size=PHOTO_JOBS_SIZE)
+        except pymongo.errors.CollectionInvalid:
+            pass  # Already created by the web app or another worker
+        except pymongo.errors.PyMongoError as e:
+            logger.warning("Could not create the photo_jobs collection: %s", e)
+
+        self.worker_id = f"{socket.gethostname()}-{os.getpid()}"
+        self._failures = 0
+
         # Initialize classifier
         logger.info("Initializing ML classifier...")
         self.classifier = AnimalClassifier()
@@ -66,27 +136,256 @@ class MLWorker:
     def process_pending_photos(self):
         """
         Main worker loop: continuously process pending photos.
+
+        Pending photos are pushed by a change stream when the server supports
+        one (replica sets). A standalone server is followed by tailing the
+        photo_jobs collection instead, and polled if that fails as well.
         """
-        logger.info(f"Starting worker loop (polling every {self.poll_interval}s)")
+        followers = (
+            (self._watch_pending_photos, "Change stream"),
+            (self._tail_photo_jobs, "Tailing photo_jobs"),
+        )
+        for follow, name in followers:
+            while True:
+                try:
+                    if not follow():
+                        logger.info("%s unavailable; falling back", name)
+                        break
+                except KeyboardInterrupt:
+                    logger.info("Worker shutting down...")
+                    return
+                except (pymongo.errors.PyMongoError, OSError) as e:
+                    self._wait_to_retry(name, e)
+
+        self._poll_pending_photos()
+
+    def _watch_pending_photos(self):
+        """
+        Process pending photos as change stream events arrive.
+
+        Events that have already been received are handled together, up to
+        batch_size photos per batch.
 
+        Returns:
+            bool: False if the server does not support change streams, True
+            once the stream ends and should be reopened
+        """
+        try:
+            stream = self.photos_collection.watch(
+                PENDING_CHANGES, full_document="updateLookup"
+            )
+        except pymongo.errors.OperationFailure as e:
+            if e.code != CHANGE_STREAMS_UNSUPPORTED:
+                raise
+            return False
+        with stream:
+            logger.info("Watching for pending photos")
+            self._failures = 0
+            # Photos queued before the stream opened produce no events
+            self._release_stale_claims()
+            self._process_backlog()
+            for change in stream:
+                batch = [change["fullDocument"]]
+                # try_next() on an empty buffer would wait on another getMore
+                while len(batch) < self.batch_size and _has_buffered(stream):
+                    batch.append(stream.try_next()["fullDocument"])
+                self._claim_and_process(batch)
+        return True
+
+    def _tail_photo_jobs(self):
+        """
+        Process pending photos as the web app queues jobs for them.
+
+        photo_jobs is capped, so a tailable cursor can wait inside MongoDB
+        for the next job rather than the worker polling for it.
+
+        Returns:
+            bool: False if photo_jobs is not a capped collection
+        """
+        if not self.photo_jobs.options().get("capped"):
+            return False
+        newest = self.photo_jobs.find_one(sort=[("$natural", -1)])
+        last_id = newest["_id"] if newest else None
+        logger.info("Tailing photo_jobs for pending photos")
+        self._failures = 0
         while True:
+            # Also picks up photos whose jobs went by while no cursor was open
+            self._release_stale_claims()
+            self._process_backlog()
+
+            query = {} if last_id is None else {"_id": {"$gt": last_id}}
+            cursor = self.photo_jobs.find(
+                query, cursor_type=pymongo.CursorType.TAILABLE_AWAIT
+            ).max_await_time_ms(JOB_AWAIT_MS)
+            taken = 0
             try:
-                # Find one pending photo
-                pending = self.photos_collection.find_one({"status": "pending"})
+                with cursor:
+                    while cursor.alive:
+                        job = next(cursor, None)
+                        if job is None:
+                            continue
+                        jobs = [job]
+                        taken += 1
+                        # Jobs past cursor.retrieved would wait on another getMore
+                        while len(jobs) < self.batch_size and taken < cursor.retrieved:
+                            jobs.append(next(cursor))
+                            taken += 1
+                        last_id = jobs[-1]["_id"]
+                        self._claim_and_process(
+                            [{"_id": job["photo_id"]} for job in jobs]
+                        )
+            except pymongo.errors.OperationFailure as e:
+                if e.code != CAPPED_POSITION_LOST:
+                    raise
+                logger.warning("Fell behind on photo_jobs; reopening the cursor")
+                continue
+
+            # A tailable cursor on an empty collection dies straight away
+            time.sleep(self.poll_interval)
+
+    def _process_backlog(self):
+        """Process every photo that is pending right now, one batch at a time."""
+        last_id = None
+        while True:
+            query = {"status": "pending"}
+            if last_id is not None:
+                query["_id"] = {"$gt": last_id}
+            pending = list(
+                self.photos_collection.find(query).sort("_id", 1).limit(self.batch_size)
+            )
+            if not pending:
+                return
+            self._claim_and_process(pending)
+            last_id = pending[-1]["_id"]
+
+    def _poll_pending_photos(self):
+        """
+        Poll for pending photos.
+
+        The wait between polls starts at MIN_POLL_INTERVAL, doubles after
+        every poll that finds nothing up to poll_interval, and drops back
+        as soon as a photo turns up.
+        """
+        logger.info(
+            "Starting worker loop (polling at least every %ss)", self.poll_interval
+        )
+
+        delay = MIN_POLL_INTERVAL
+        while True:
+            try:
+                self._release_stale_claims()
+
+                # Find a batch of pending photos
+                pending = list(
+                    self.photos_collection.find({"status": "pending"}).limit(
+                        self.batch_size
+                    )
+                )
+
+                self._failures = 0
 
                 if pending:
-                    self._process_photo(pending)
+                    self._claim_and_process(pending)
+                    delay = MIN_POLL_INTERVAL
                 else:
                     logger.debug("No pending photos found")
 
             except KeyboardInterrupt:
                 logger.info("Worker shutting down...")
                 break
-            except Exception as e:
-                logger.error(f"Error in worker loop: {e}", exc_info=True)
+            except (pymongo.errors.PyMongoError, OSError) as e:
+                self._wait_to_retry("Polling", e)
+                continue
 
             # Wait before next poll
-            time.sleep(self.poll_interval)
+            time.sleep(min(delay, self.poll_interval))
+            delay *= 2
+
+    def _wait_to_retry(self, name, error):
+        """
+        Log a failed pass of a worker loop and sleep before the next one.
+
+        Lost connections back off exponentially, so a MongoDB outage is not
+        hammered; any other database error waits poll_interval.
+
+        Args:
+            name: What failed, for the log message
+            error: The exception raised
+        """
+        if isinstance(error, pymongo.errors.ConnectionFailure):
+            self._failures += 1
+            delay = min(2**self._failures, MAX_RETRY_DELAY)
+            logger.error("%s lost MongoDB (%s); retrying in %ss", name, error, delay)
+        else:
+            delay = self.poll_interval
+            logger.error("%s failed: %s", name, error, exc_info=True)
+        time.sleep(delay)
+
+    def _claim_and_process(self, photo_docs):
+        """
+        Claim pending photos for this worker, then process the ones it got.
+
+        Args:
+            photo_docs: Pending MongoDB documents from photos collection
+        """
+        claimed = self._claim([photo_doc["_id"] for photo_doc in photo_docs])
+        if claimed:
+            self._process_batch(claimed)
+
+    def _claim(self, photo_ids):
+        """
+        Atomically mark pending photos as processing by this worker.
+
+        Args:
+            photo_ids: ObjectIds of the photos to claim
+
+        Returns:
+            The claimed photo documents; photos another worker claimed
+            first are left out
+        """
+        self.photos_collection.update_many(
+            {"_id": {"$in": photo_ids}, "status": "pending"},
+            {
+                "$set": {
+                    "status": "processing",
+                    "worker_id": self.worker_id,
+                    "claimed_at": datetime.utcnow(),
+                }
+            },
+        )
+        return list(
+            self.photos_collection.find(
+                {
+                    "_id": {"$in": photo_ids},
+                    "status": "processing",
+                    "worker_id": self.worker_id,
+                }
+            )
+        )
+
+    def _release_stale_claims(self):
+        """
+        Put claimed photos that will not be finished back to pending.
+
+        That is any claim older than CLAIM_TIMEOUT, plus this worker's own
+        claims: it is only called between batches, so those were left by a
+        batch that failed part way, e.g. on a lost connection.
+        """
+        result = self.photos_collection.update_many(
+            {
+                "status": "processing",
+                "$or": [
+                    {"claimed_at": {"$lt": datetime.utcnow() - CLAIM_TIMEOUT}},
+                    {"worker_id": self.worker_id},
+                ],
+            },
+            {
+                "$set": {"status": "pending"},
+                "$unset": {"worker_id": "", "claimed_at": ""},
+            },
+        )
+        if result.modified_count:
+            logger.warning("Released %d stale photo claim(s)", result.modified_count)
 
     def _process_photo(self, photo_doc):
         """
@@ -95,90 +394,175 @@ class MLWorker:
         Args:
             photo_doc: MongoDB document from photos collection
         """
+        self._process_batch([photo_doc])
+
+    def _process_batch(self, photo_docs):
+        """
+        Classify a batch of photo documents and store the results in one write.
+
+        Args:
+            photo_docs: MongoDB documents from photos collection
+        """
+        failures = []
+        ready = []
+        for photo_doc in photo_docs:
+            error = self._check_photo(photo_doc)
+            if error:
+                failures.append((photo_doc["_id"], error))
+            else:
+                ready.append(photo_doc)
+        results = self._classify(ready) if ready else []
+
+        # Every update in the batch shares one timestamp
+        now = datetime.utcnow()
+        updates = [self._failed_update(*failure, now) for failure in failures]
+        updates.extend(
+            self._result_update(photo_doc, result, now)
+            for photo_doc, result in zip(ready, results)
+        )
+
+        try:
+            result = self.photos_collection.bulk_write(updates, ordered=False)
+        except pymongo.errors.OperationFailure as e:
+            # A lost connection propagates to the worker loop's retry backoff
+            logger.error(
+                "Failed to store results for %d photo(s): %s",
+                len(updates),
+                e,
+                exc_info=True,
+            )
+            return
+
+        if result.modified_count == len(updates):
+            logger.info("✓ Updated %d photo(s) with results", result.modified_count)
+        else:
+            logger.warning(
+                "Only %d of %d photo(s) were updated (already modified?)",
+                result.modified_count,
+                len(updates),
+            )
+
+    def _check_photo(self, photo_doc):
+        """
+        Check that a photo document has a file to classify.
+
+        Args:
+            photo_doc: MongoDB document from photos collection
+
+        Returns:
+            Error message if the photo cannot be classified, otherwise None
+        """
         photo_id = photo_doc["_id"]
         filepath = photo_doc.get("filepath")
         filename = photo_doc.get("filename", "unknown")
 
-        logger.info(f"Processing photo: {filename} (ID: {photo_id})")
+        logger.info("Processing photo: %s (ID: %s)", filename, photo_id)
 
         if not filepath:
-            logger.error(f"Photo {photo_id} has no filepath")
-            self._mark_failed(photo_id, "No filepath provided")
-            return
-
-        # Check if file exists
-        if not os.path.exists(filepath):
-            logger.error(f"File not found: {filepath}")
-            self._mark_failed(photo_id, f"File not found: {filepath}")
-            return
+            logger.error("Photo %s has no filepath", photo_id)
+            return "No filepath provided"
 
-        try:
-            # Run ML classification (don't save to separate collection)
-            result = self.classifier.predict(filepath, save_to_db=False)
+        # No stat here: a missing or unreadable file comes back from the
+        # classifier as an error result for that photo
+        return None
 
-            if "error" in result:
-                # Classification failed
-                logger.error(f"Classification failed for {filename}: {result['error']}")
-                self._mark_failed(photo_id, result["error"])
-                return
+    def _classify(self, photo_docs):
+        """
+        Classify photo documents with one batched model call.
 
-            # Extract results
-            animal_type = result.get("animal_type")
-            confidence = result.get("confidence")
-            processing_time_ms = result.get("processing_time_ms")
+        Args:
+            photo_docs: MongoDB documents whose files exist
 
-            logger.info(
-                f"✓ Classified {filename} as '{animal_type}' "
-                f"(confidence: {confidence:.2%}, time: {processing_time_ms}ms)"
+        Returns:
+            List of result dictionaries, one per document; a failed call
+            gives every document an error result
+        """
+        try:
+            # Run ML classification (don't save to separate collection)
+            return self.classifier.predict_batch(
+                [photo_doc["filepath"] for photo_doc in photo_docs],
+                batch_size=self.batch_size,
+                save_to_db=False,
+                return_all_predictions=True,
             )
-
-            # Update the photo document with results
-            update_result = self.photos_collection.update_one(
-                {"_id": photo_id},
-                {
-                    "$set": {
-                        "animal_type": animal_type,
-                        "confidence": confidence,
-                        "processing_time_ms": processing_time_ms,
-                        "model_version": result.get("model_version", "v1.0"),
-                        "status": "done",
-                        "updated_at": datetime.utcnow(),
-                        "all_predictions": result.get("all_predictions", {}),
-                    }
-                },
+        except Exception as e:
+            logger.error(
+                "Error classifying %d photo(s): %s", len(photo_docs), e, exc_info=True
             )
+            return [{"error": str(e)} for _ in photo_docs]
 
-            if update_result.modified_count == 1:
-                logger.info(f"✓ Updated photo {photo_id} with classification results")
-            else:
-                logger.warning(f"Photo {photo_id} was not updated (already modified?)")
+    def _result_update(self, photo_doc, result, now):
+        """
+        Build the update storing one classification result.
 
-        except Exception as e:
-            logger.error(f"Error processing photo {photo_id}: {e}", exc_info=True)
-            self._mark_failed(photo_id, str(e))
+        Args:
+            photo_doc: MongoDB document from photos collection
+            result: Result dictionary returned by the classifier
+            now: Timestamp stored as updated_at
+
+        Returns:
+            UpdateOne storing the classification, or the failure if it errored
+        """
+        photo_id = photo_doc["_id"]
+        filename = photo_doc.get("filename", "unknown")
 
-    def _mark_failed(self, photo_id, error_message):
+        if "error" in result:
+            # Classification failed
+            logger.error("Classification failed for %s: %s", filename, result["error"])
+            return self._failed_update(photo_id, result["error"], now)
+
+        # Extract results
+        animal_type = result.get("animal_type")
+        confidence = result.get("confidence")
+        processing_time_ms = result.get("processing_time_ms")
+
+        logger.info(
+            "✓ Classified %s as '%s' (confidence: %.2f%%, time: %sms)",
+            filename,
+            animal_type,
+            confidence * 100,
+            processing_time_ms,
+        )
+
+        # Update the photo document with results
+        return pymongo.UpdateOne(
+            {"_id": photo_id},
+            {
+                "$set": {
+                    "animal_type": animal_type,
+                    "confidence": confidence,
+                    "processing_time_ms": processing_time_ms,
+                    "model_version": result.get("model_version", "v1.0"),
+                    "status": "done",
+                    "updated_at": now,
+                    "all_predictions": result.get("all_predictions", {}),
+                }
+            },
+        )
+
+    @staticmethod
+    def _failed_update(photo_id, error_message, now):
         """
-        Mark a photo as failed with error message.
+        Build the update that marks a photo as failed.
 
         Args:
             photo_id: MongoDB ObjectId of the photo
             error_message: Description of the error
+            now: Timestamp stored as updated_at
+
+        Returns:
+            UpdateOne setting the failed status and error message
         """
-        try:
-            self.photos_collection.update_one(
-                {"_id": photo_id},
-                {
-                    "$set": {
-                        "status": "failed",
-                        "error": error_message,
-                        "updated_at": datetime.utcnow(),
-                    }
-                },
-            )
-            logger.info(f"Marked photo {photo_id} as failed")
-        except Exception as e:
-            logger.error(f"Failed to mark photo {photo_id} as failed: {e}")
+        return pymongo.UpdateOne(
+            {"_id": photo_id},
+            {
+                "$set": {
+                    "status": "failed",
+                    "error": error_message,
+                    "updated_at": now,
+                }
+            },
+        )
 
     def close(self):
         """Clean up resources."""
@@ -190,8 +574,50 @@ class MLWorker:
             logger.info("Classifier closed")
 
 
+def _has_buffered(stream):
+    """
+    Check whether a change stream holds events it has already received.
+
+    pymongo has no public way to ask; try_next() sends a getMore, which
+    waits on the server, whenever the buffer is empty. The private cursor
+    this peeks at is checked for, so a pymongo release without it only
+    costs the batching: every event is then handled on its own.
+    """
+    cursor = getattr(stream, "_cursor", None)
+    has_next = getattr(cursor, "_has_next", None)
+    return bool(has_next()) if callable(has_next) else False
+
+
+def _start_log_listener():
+    """
+    Move log output off the worker thread.
+
+    The root logger's handlers are replaced by a QueueHandler, and a
+    QueueListener thread writes the records to the original handlers.
+
+    Returns:
+        The started QueueListener; stop() flushes and ends it
+    """
+    root = logging.getLogger()
+    log_queue = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(
+        log_queue, *root.handlers, respect_handler_level=True
+    )
+    root.handlers = [logging.handlers.QueueHandler(log_queue)]
+    listener.start()
+    return listener
+
+
+def _stop_on_sigterm(signum, frame):  # pylint: disable=unused-argument
+    """Shut down on SIGTERM (docker stop) the same way as on Ctrl+C."""
+    raise KeyboardInterrupt
+
+
 def main():
     """Main entry point for the worker."""
+    listener = _start_log_listener()
+    # Without a handler SIGTERM kills the process before worker.close() runs
+    signal.signal(signal.SIGTERM, _stop_on_sigterm)
     logger.info("=" * 60)
     logger.info("ML Worker Service Starting")
     logger.info("=" * 60)
@@ -202,12 +628,13 @@ def main():
     except KeyboardInterrupt:
         logger.info("Received shutdown signal")
     except Exception as e:
-        logger.error(f"Worker failed to start: {e}", exc_info=True)
+        logger.error("Worker failed to start: %s", e, exc_info=True)
     finally:
         if "worker" in locals():
             worker.close()
 
     logger.info("ML Worker Service Stopped")
+    listener.stop()
 
 
 if __name__ == "__main__":
@@ -4,21 +4,34 @@ Unit tests for the animal classifier module.
 
 # pylint: skip-file
 import os
-import sys
 from unittest.mock import Mock, patch, MagicMock
 import numpy as np
 import pytest
-from PIL import Image
-
-# Add src to path for imports
-sys.path.insert(0, os.path.join(os.path.dirname(__file__), "../src"))
+from PIL import Image, JpegImagePlugin
 
 # pylint: disable=wrong-import-position,import-error
+import classifier as classifier_module
 from classifier import AnimalClassifier
 
+REAL_COMPILE_FORWARD = classifier_module._compile_forward
+
 # pylint: enable=wrong-import-position,import-error
 
 
+@pytest.fixture(autouse=True)
+def clear_model_cache(monkeypatch):
+    """
+    Reset the process-wide model caches and database handler so each test
+    loads its own mocks, and run mock models eagerly instead of tracing
+    them with XLA.
+    """
+    classifier_module._load_cached.cache_clear()
+    REAL_COMPILE_FORWARD.cache_clear()
+    monkeypatch.setattr(classifier_module, "_compile_forward", lambda model: None)
+    monkeypatch.setattr(classifier_module.DatabaseHandler, "_shared", None)
+    monkeypatch.setattr(classifier_module.DatabaseHandler, "_shared_refs", 0)
+
+
 @pytest.fixture
 def sample_image(tmp_path):
     """Create a sample test image."""
@@ -42,7 +55,7 @@ def sample_labels(tmp_path):
 def mock_model():
     """Create a mock TensorFlow model."""
     model = Mock()
-    model.predict.return_value = np.array([[0.1, 0.2, 0.05, 0.15, 0.5]])
+    model.return_value = np.array([[0.1, 0.2, 0.05, 0.15, 0.5]])
     return model
 
 
@@ -63,7 +76,9 @@ class TestAnimalClassifier:
 
         assert classifier.model is not None
         assert len(classifier.class_names) == 5
-        mock_load_model.assert_called_once_with(mock_model_path, compile=False)
+        mock_load_model.assert_called_once_with(
+            os.path.realpath(mock_model_path), compile=False
+        )
 
     @patch("classifier.load_model")
     def test_load_labels(
@@ -102,6 +117,28 @@ class TestAnimalClassifier:
         # Check data type
         assert processed.dtype == np.float32
 
+    @patch("classifier.load_model")
+    def test_preprocess_image_reuses_buffer(
+        self, mock_load_model, mock_model, sample_labels, sample_image
+    ):  # pylint: disable=redefined-outer-name
+        """Test preprocessing writes into the classifier's input buffer."""
+        mock_load_model.return_value = mock_model
+
+        classifier = AnimalClassifier(
+            model_path="/fake/model.h5", labels_path=sample_labels
+        )
+        first = classifier.preprocess_image(sample_image)
+        second = classifier.preprocess_image(sample_image)
+
+        assert first is second
+        assert first is classifier._input_buf
+        # (100, 150, 200) scaled to [-1, 1]
+        np.testing.assert_allclose(
+            first[0, 0, 0],
+            [100 / 127.5 - 1, 150 / 127.5 - 1, 200 / 127.5 - 1],
+            atol=0.05,
+        )
+
     @patch("classifier.load_model")
     def test_predict(self, mock_load_model, mock_model, sample_labels, sample_image):
         """Test image classification prediction."""
@@ -117,7 +154,8 @@ class TestAnimalClassifier:
         assert class_name == "4 Dog"
         assert confidence == 0.5
         assert isinstance(confidence, float)
-        mock_model.predict.assert_called_once()
+        # One warm-up call at init plus the prediction itself
+        assert mock_model.call_count == 2
 
     @patch("classifier.load_model")
     def test_predict_with_different_probabilities(
@@ -125,7 +163,7 @@ class TestAnimalClassifier:
     ):
         """Test prediction with different probability distributions."""
         mock_model = Mock()
-        mock_model.predict.return_value = np.array([[0.8, 0.1, 0.05, 0.03, 0.02]])
+        mock_model.return_value = np.array([[0.8, 0.1, 0.05, 0.03, 0.02]])
         mock_load_model.return_value = mock_model
 
         classifier = AnimalClassifier(
@@ -177,8 +215,54 @@ class TestAnimalClassifier:
         assert class_name2 == "4 Dog"
         assert confidence2 == 0.5
 
-        # Model should be called twice
-        assert mock_model.predict.call_count == 2
+        # Model should be called twice after the warm-up call
+        assert mock_model.call_count == 3
+
+    @patch("classifier.load_model")
+    def test_init_warms_up_model(
+        self, mock_load_model, mock_model, sample_labels
+    ):  # pylint: disable=redefined-outer-name
+        """Test a dummy batch is run through the model at init."""
+        mock_load_model.return_value = mock_model
+
+        AnimalClassifier(model_path="/fake/model.h5", labels_path=sample_labels)
+
+        mock_model.assert_called_once()
+        warm_up_batch = mock_model.call_args[0][0]
+        assert warm_up_batch.shape == (1, 224, 224, 3)
+        assert not np.asarray(warm_up_batch).any()
+
+    @patch("classifier.load_model")
+    def test_init_skips_warm_up_when_compiled(
+        self, mock_load_model, mock_model, sample_labels, monkeypatch
+    ):  # pylint: disable=redefined-outer-name
+        """Test the compiled forward pass is not run again after tracing."""
+        mock_load_model.return_value = mock_model
+        infer = Mock()
+        monkeypatch.setattr(classifier_module, "_compile_forward", lambda model: infer)
+
+        AnimalClassifier(model_path="/fake/model.h5", labels_path=sample_labels)
+
+        infer.assert_not_called()
+        mock_model.assert_not_called()
+
+    @patch("classifier.load_model")
+    def test_init_survives_warm_up_failure(
+        self, mock_load_model, sample_labels, sample_image
+    ):
+        """Test a failing warm-up does not break classifier construction."""
+        model = Mock()
+        model.side_effect = [
+            RuntimeError("kernel error"),
+            np.array([[0.1, 0.2, 0.05, 0.15, 0.5]]),
+        ]
+        mock_load_model.return_value = model
+
+        classifier = AnimalClassifier(
+            model_path="/fake/model.h5", labels_path=sample_labels
+        )
+
+        assert classifier.predict(sample_image)["animal_type"] == "4 Dog"
 
     @patch("classifier.load_model")
     def test_preprocess_image_size(
@@ -199,3 +283,423 @@ class TestAnimalClassifier:
 
         # Should be resized to 224x224
         assert processed.shape == (1, 224, 224, 3)
+
+    @patch("classifier._convert_to_tflite")
+    @patch("classifier.tf.lite.Interpreter")
+    def test_predict_tflite_backend(
+        self,
+        mock_interpreter_class,
+        mock_convert,
+        sample_labels,
+        sample_image,
+        tmp_path,
+    ):
+        """Test prediction through the TFLite interpreter backend."""
+        interpreter = mock_interpreter_class.return_value
+        interpreter.get_input_details.return_value = [{"index": 0}]
+        interpreter.get_output_details.return_value = [{"index": 7}]
+        interpreter.get_tensor.return_value = np.array([[0.1, 0.6, 0.1, 0.1, 0.1]])
+
+        with patch.dict(os.environ, {"MODEL_BACKEND": "tflite"}):
+            classifier = AnimalClassifier(
+                model_path=str(tmp_path / "model.h5"), labels_path=sample_labels
+            )
+        result = classifier.predict(sample_image, save_to_db=False)
+
+        mock_convert.assert_called_once_with(
+            str(tmp_path / "model.h5"), str(tmp_path / "model.tflite"), "float16"
+        )
+        interpreter.allocate_tensors.assert_called_once()
+        assert interpreter.invoke.call_count == 2
+        interpreter.get_tensor.assert_called_with(7)
+        assert result["animal_type"] == "1 Cat"
+
+    @patch("classifier._convert_to_tflite")
+    @patch("classifier.tf.lite.Interpreter")
+    def test_tflite_int8_quantization(
+        self, mock_interpreter_class, mock_convert, sample_labels, tmp_path
+    ):
+        """Test TFLITE_QUANTIZATION=int8 converts to a separate int8 model."""
+        interpreter = mock_interpreter_class.return_value
+        interpreter.get_input_details.return_value = [{"index": 0}]
+        interpreter.get_output_details.return_value = [{"index": 1}]
+
+        env = {"MODEL_BACKEND": "tflite", "TFLITE_QUANTIZATION": "int8"}
+        with patch.dict(os.environ, env):
+            AnimalClassifier(
+                model_path=str(tmp_path / "model.h5"), labels_path=sample_labels
+            )
+
+        int8_path = str(tmp_path / "model_int8.tflite")
+        mock_convert.assert_called_once_with(
+            str(tmp_path / "model.h5"), int8_path, "int8"
+        )
+        assert mock_interpreter_class.call_args.kwargs["model_path"] == int8_path
+
+    def test_converted_path_changes_with_model(self, tmp_path):
+        """Test a replaced .h5 file maps to a new converted model path."""
+        model_path = tmp_path / "model.h5"
+        model_path.write_bytes(b"old weights")
+        old_path = classifier_module._converted_path(str(model_path), ".tflite")
+
+        model_path.write_bytes(b"new, larger weights")
+        new_path = classifier_module._converted_path(str(model_path), ".tflite")
+
+        assert old_path != new_path
+        assert os.path.dirname(new_path) == str(tmp_path)
+        assert os.path.basename(new_path).startswith("model-")
+
+    def test_replace_when_done_is_all_or_nothing(self, tmp_path):
+        """Test a failed write leaves nothing behind and a good one lands whole."""
+        target = tmp_path / "model.tflite"
+
+        with pytest.raises(RuntimeError):
+            with classifier_module._replace_when_done(str(target)) as tmp:
+                with open(tmp, "wb") as f:
+                    f.write(b"trunc")
+                raise RuntimeError("converter crashed")
+        assert list(tmp_path.iterdir()) == []
+
+        with classifier_module._replace_when_done(str(target)) as tmp:
+            with open(tmp, "wb") as f:
+                f.write(b"model")
+        assert list(tmp_path.iterdir()) == [target]
+        assert target.read_bytes() == b"model"
+
+    @patch("classifier._convert_to_tflite")
+    @patch("classifier.tf.lite.Interpreter")
+    def test_tflite_model_cache_dir(
+        self, mock_interpreter_class, mock_convert, sample_labels, tmp_path
+    ):
+        """Test MODEL_CACHE_DIR holds the converted model, not the models folder."""
+        interpreter = mock_interpreter_class.return_value
+        interpreter.get_input_details.return_value = [{"index": 0}]
+        interpreter.get_output_details.return_value = [{"index": 1}]
+        cache_dir = tmp_path / "cache"
+
+        env = {"MODEL_BACKEND": "tflite", "MODEL_CACHE_DIR": str(cache_dir)}
+        with patch.dict(os.environ, env):
+            AnimalClassifier(
+                model_path=str(tmp_path / "model.h5"), labels_path=sample_labels
+            )
+
+        cached_path = str(cache_dir / "model.tflite")
+        mock_convert.assert_called_once_with(
+            str(tmp_path / "model.h5"), cached_path, "float16"
+        )
+        assert cache_dir.is_dir()
+        assert mock_interpreter_class.call_args.kwargs["model_path"] == cached_path
+
+    @patch("classifier._convert_to_tflite")
+    @patch("classifier.tf.lite.Interpreter")
+    def test_tflite_predict_batch_single_invoke(
+        self, mock_interpreter_class, mock_convert, sample_labels, sample_image
+    ):
+        """Test a TFLite batch is resized into one invoke instead of one per image."""
+        interpreter = mock_interpreter_class.return_value
+        interpreter.get_input_details.return_value = [{"index": 0}]
+        interpreter.get_output_details.return_value = [{"index": 1}]
+        interpreter.get_tensor.return_value = np.tile([0.1, 0.6, 0.1, 0.1, 0.1], (3, 1))
+
+        with patch.dict(os.environ, {"MODEL_BACKEND": "tflite"}):
+            classifier = AnimalClassifier(
+                model_path="/fake/model.h5", labels_path=sample_labels
+            )
+        interpreter.invoke.reset_mock()
+        results = classifier.predict_batch([sample_image] * 3, save_to_db=False)
+
+        interpreter.resize_tensor_input.assert_called_once_with(0, (3, 224, 224, 3))
+        interpreter.invoke.assert_called_once()
+        assert [r["animal_type"] for r in results] == ["1 Cat"] * 3
+
+    @patch("classifier._convert_to_onnx")
+    def test_predict_onnx_backend(
+        self, mock_convert, sample_labels, sample_image, tmp_path
+    ):
+        """Test prediction through an ONNX Runtime session."""
+        onnxruntime = MagicMock()
+        session = onnxruntime.InferenceSession.return_value
+        session.get_inputs.return_value = [Mock()]
+        session.get_inputs.return_value[0].name = "input"
+        session.run.return_value = [np.array([[0.1, 0.1, 0.6, 0.1, 0.1]])]
+
+        with patch.dict(os.environ, {"MODEL_BACKEND": "onnx"}), patch.dict(
+            "sys.modules", {"onnxruntime": onnxruntime}
+        ):
+            classifier = AnimalClassifier(
+                model_path=str(tmp_path / "model.h5"), labels_path=sample_labels
+            )
+        result = classifier.predict(sample_image, save_to_db=False)
+
+        mock_convert.assert_called_once_with(
+            str(tmp_path / "model.h5"), str(tmp_path / "model.onnx")
+        )
+        assert onnxruntime.InferenceSession.call_args.args == (
+            str(tmp_path / "model.onnx"),
+        )
+        assert session.run.call_args.args[1]["input"].shape == (1, 224, 224, 3)
+        assert result["animal_type"] == "2 Chicken"
+
+    @patch("classifier._compile_forward", REAL_COMPILE_FORWARD)
+    @patch("classifier.load_model")
+    def test_predict_compiled_keras_model(
+        self, mock_load_model, sample_labels, sample_image
+    ):
+        """Test prediction through the XLA-compiled forward pass."""
+        import tensorflow as tf
+
+        model = tf.keras.Sequential(
+            [
+                tf.keras.Input(shape=(224, 224, 3)),
+                tf.keras.layers.GlobalAveragePooling2D(),
+                tf.keras.layers.Dense(5, activation="softmax"),
+            ]
+        )
+        mock_load_model.return_value = model
+
+        classifier = AnimalClassifier(
+            model_path="/fake/model.h5", labels_path=sample_labels
+        )
+        assert classifier._infer is not None
+        (spec,) = classifier._infer.structured_input_signature[0]
+        assert spec.shape.as_list() == [None, 224, 224, 3]
+
+        result = classifier.predict(
+            sample_image, save_to_db=False, return_all_predictions=True
+        )
+        assert abs(sum(result["all_predictions"].values()) - 1.0) < 1e-4
+
+    @patch("classifier.load_model")
+    def test_model_loaded_once_per_path(
+        self, mock_load_model, mock_model, sample_labels
+    ):  # pylint: disable=redefined-outer-name
+        """Test classifiers sharing a model path reuse the loaded model."""
+        mock_load_model.return_value = mock_model
+
+        first = AnimalClassifier(model_path="/fake/model.h5", labels_path=sample_labels)
+        second = AnimalClassifier(
+            model_path="/fake/model.h5", labels_path=sample_labels
+        )
+
+        assert first.model is second.model
+        assert first.class_names is second.class_names
+        mock_load_model.assert_called_once()
+
+    @patch("classifier.load_model")
+    def test_all_predictions_keeps_top_five(
+        self, mock_load_model, sample_image, tmp_path
+    ):
+        """Test all_predictions reports only the five best classes, in order."""
+        labels_path = tmp_path / "labels7.txt"
+        labels_path.write_text("\n".join(f"{i} Class{i}" for i in range(7)))
+        model = Mock()
+        model.return_value = np.array([[0.05, 0.3, 0.02, 0.1, 0.25, 0.2, 0.08]])
+        mock_load_model.return_value = model
+
+        classifier = AnimalClassifier(
+            model_path="/fake/model.h5", labels_path=str(labels_path)
+        )
+        result = classifier.predict(
+            sample_image, save_to_db=False, return_all_predictions=True
+        )
+
+        assert list(result["all_predictions"]) == [
+            "1 Class1",
+            "4 Class4",
+            "5 Class5",
+            "3 Class3",
+            "6 Class6",
+        ]
+        assert result["animal_type"] == "1 Class1"
+
+    @patch("classifier.load_model")
+    def test_preprocess_large_jpeg_uses_draft(
+        self, mock_load_model, mock_model, sample_labels, tmp_path
+    ):  # pylint: disable=redefined-outer-name
+        """Test large JPEGs are decoded at a reduced DCT scale."""
+        mock_load_model.return_value = mock_model
+
+        large_img_path = tmp_path / "photo.jpg"
+        Image.new("RGB", (4000, 3000), color=(10, 20, 30)).save(str(large_img_path))
+
+        classifier = AnimalClassifier(
+            model_path="/fake/model.h5", labels_path=sample_labels
+        )
+        jpeg_cls = JpegImagePlugin.JpegImageFile
+        with patch.object(
+            jpeg_cls, "draft", autospec=True, side_effect=jpeg_cls.draft
+        ) as mock_draft:
+            processed = classifier.preprocess_image(str(large_img_path))
+
+        mock_draft.assert_called_once()
+        assert mock_draft.call_args[0][1:] == ("RGB", (224, 224))
+        assert processed.shape == (1, 224, 224, 3)
+
+    @patch("classifier.load_model")
+    def test_image_ids_are_unique(
+        self, mock_load_model, mock_model, sample_labels, sample_image
+    ):  # pylint: disable=redefined-outer-name
+        """Test predictions in the same second get distinct image ids."""
+        mock_load_model.return_value = mock_model
+
+        classifier = AnimalClassifier(
+            model_path="/fake/model.h5", labels_path=sample_labels
+        )
+        first = classifier.predict(sample_image, save_to_db=False)["image_id"]
+        second = classifier.predict(sample_image, save_to_db=False)["image_id"]
+
+        assert first != second
+        assert first.endswith("_test_image.jpg")
+
+    @patch("classifier.load_model")
+    def test_predict_batch(
+        self, mock_load_model, mock_model, sample_labels, sample_image, tmp_path
+    ):  # pylint: disable=redefined-outer-name
+        """Test a batch is classified with one model call, keeping bad paths."""
+        mock_model.side_effect = lambda data, training=False: np.tile(
+            [0.1, 0.2, 0.05, 0.15, 0.5], (len(data), 1)
+        )
+        mock_load_model.return_value = mock_model
+
+        classifier = AnimalClassifier(
+            model_path="/fake/model.h5", labels_path=sample_labels
+        )
+        calls_before = mock_model.call_count
+        missing = str(tmp_path / "missing.jpg")
+        results = classifier.predict_batch(
+            [sample_image, missing, sample_image], save_to_db=False
+        )
+
+        assert mock_model.call_count == calls_before + 1
+        assert mock_model.call_args[0][0].shape == (2, 224, 224, 3)
+        assert [r.get("animal_type") for r in results] == ["4 Dog", None, "4 Dog"]
+        assert results[1]["image_path"] == missing
+        assert "error" in results[1]
+        assert results[0]["confidence"] == pytest.approx(0.5)
+
+    @patch("classifier.load_model")
+    def test_preprocess_jpeg_uses_turbojpeg(
+        self, mock_load_model, mock_model, sample_labels, sample_image, monkeypatch
+    ):  # pylint: disable=redefined-outer-name
+        """Test JPEGs are decoded and downscaled by libturbojpeg when present."""
+        mock_load_model.return_value = mock_model
+        jpeg = Mock()
+        jpeg.decode_header.return_value = (1600, 1200, 0, 0)
+        jpeg.decode.return_value = np.zeros((300, 400, 3), dtype=np.uint8)
+        monkeypatch.setattr(classifier_module, "_JPEG", jpeg)
+
+        classifier = AnimalClassifier(
+            model_path="/fake/model.h5", labels_path=sample_labels
+        )
+        processed = classifier.preprocess_image(sample_image)
+
+        assert processed.shape == (1, 224, 224, 3)
+        assert jpeg.decode.call_args.kwargs["scaling_factor"] == (1, 4)
+
+    @patch("classifier.load_model")
+    def test_preprocess_jpeg_falls_back_to_pil(
+        self, mock_load_model, mock_model, sample_labels, tmp_path, monkeypatch
+    ):  # pylint: disable=redefined-outer-name
+        """Test a .jpg libturbojpeg cannot decode is decoded by PIL instead."""
+        mock_load_model.return_value = mock_model
+        jpeg = Mock()
+        jpeg.decode_header.side_effect = OSError("Not a JPEG file")
+        monkeypatch.setattr(classifier_module, "_JPEG", jpeg)
+        png_path = tmp_path / "really_a_png.jpg"
+        Image.new("RGB", (300, 300), color=(10, 20, 30)).save(png_path, "PNG")
+
+        classifier = AnimalClassifier(
+            model_path="/fake/model.h5", labels_path=sample_labels
+        )
+        processed = classifier.preprocess_image(str(png_path))
+
+        assert processed.shape == (1, 224, 224, 3)
+        jpeg.decode_header.assert_called_once()
+
+    @patch("classifier.load_model")
+    def test_labels_reloaded_after_file_changes(
+        self, mock_load_model, mock_model, sample_labels
+    ):  # pylint: disable=redefined-outer-name
+        """Test cached labels are re-read once the labels file is modified."""
+        mock_load_model.return_value = mock_model
+
+        first = AnimalClassifier(model_path="/fake/model.h5", labels_path=sample_labels)
+        with open(sample_labels, "w", encoding="utf-8") as f:
+            f.write("0 Horse\r\n1 Sheep\n")
+        mtime = os.path.getmtime(sample_labels) + 1
+        os.utime(sample_labels, (mtime, mtime))
+        second = AnimalClassifier(
+            model_path="/fake/model.h5", labels_path=sample_labels
+        )
+
+        assert first.class_names[0] == "0 Butterfly"
+        assert second.class_names == ("0 Horse", "1 Sheep")
+
+    @patch("classifier.load_model")
+    def test_predict_batch_reuses_buffer(
+        self, mock_load_model, mock_model, sample_labels, sample_image
+    ):  # pylint: disable=redefined-outer-name
+        """Test batches are normalized into one reused float32 buffer."""
+        mock_model.side_effect = lambda data, training=False: np.tile(
+            [0.1, 0.2, 0.05, 0.15, 0.5], (len(data), 1)
+        )
+        mock_load_model.return_value = mock_model
+
+        classifier = AnimalClassifier(
+            model_path="/fake/model.h5", labels_path=sample_labels
+        )
+        classifier.predict_batch([sample_image] * 3, save_to_db=False)
+        buffer = classifier._batch_buf
+        classifier.predict_batch([sample_image] * 2, save_to_db=False)
+
+        assert classifier._batch_buf is buffer
+        batch = mock_model.call_args[0][0].numpy()
+        assert batch.shape == (2, 224, 224, 3)
+        assert batch.dtype == np.float32
+        np.testing.assert_allclose(
+            batch[0, 0, 0], [100, 150, 200] / np.float32(127.5) - 1, atol=0.02
+        )
+
+    @patch("classifier.load_model")
+    def test_preprocess_resample_filter(
+        self, mock_load_model, mock_model, sample_labels, sample_image
+    ):  # pylint: disable=redefined-outer-name
+        """Test images are resized bilinearly unless another filter is given."""
+        mock_load_model.return_value = mock_model
+        default = AnimalClassifier(
+            model_path="/fake/model.h5", labels_path=sample_labels
+        )
+        lanczos = AnimalClassifier(
+            model_path="/fake/model.h5",
+            labels_path=sample_labels,
+            resample=Image.Resampling.LANCZOS,
+        )
+
+        with patch(
+            "classifier.ImageOps.fit", wraps=classifier_module.ImageOps.fit
+        ) as fit:
+            default.preprocess_image(sample_image)
+            lanczos.preprocess_image(sample_image)
+
+        assert [c.args[2] for c in fit.call_args_list] == [
+            Image.Resampling.BILINEAR,
+            Image.Resampling.LANCZOS,
+        ]
+
+    @patch("classifier.load_model")
+    def test_predict_returns_native_numbers(
+        self, mock_load_model, mock_model, sample_labels, sample_image
+    ):  # pylint: disable=redefined-outer-name
+        """Test results hold Python numbers rather than NumPy scalars."""
+        mock_model.return_value = np.array([[0.1, 0.2, 0.05, 0.15, 0.5]], np.float32)
+        mock_load_model.return_value = mock_model
+
+        classifier = AnimalClassifier(
+            model_path="/fake/model.h5", labels_path=sample_labels
+        )
+        result = classifier.predict(sample_image, save_to_db=False)
+        (batch_result,) = classifier.predict_batch([sample_image], save_to_db=False)
+
+        for item in (result, batch_result):
+            assert type(item["confidence"]) is float
+            assert type(item["processing_time_ms"]) is int
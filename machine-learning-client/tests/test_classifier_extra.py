@@ -6,8 +6,22 @@ Unit tests for the animal classifier module.
 import os
 from unittest.mock import patch, MagicMock
 import numpy as np
+import pytest
 
-from src.classifier import AnimalClassifier
+import classifier as classifier_module
+from classifier import AnimalClassifier
+
+
+@pytest.fixture(autouse=True)
+def clear_model_cache(monkeypatch):
+    """
+    Reset the process-wide model cache and database handler so each test
+    loads its own mocks, and run mock models eagerly instead of tracing
+    them with XLA.
+    """
+    classifier_module._load_cached.cache_clear()
+    monkeypatch.setattr(classifier_module, "_compile_forward", lambda model: None)
+    monkeypatch.setattr(classifier_module.DatabaseHandler, "_shared", None)
 
 
 def make_labels(tmp_path):
@@ -17,7 +31,7 @@ def make_labels(tmp_path):
     return str(labels)
 
 
-@patch("src.classifier.load_model")
+@patch("classifier.load_model")
 def test_get_stats_with_db(mock_load_model, tmp_path):
     """Test that get_stats() returns DB stats when DB is connected."""
     mock_model = MagicMock()
@@ -39,24 +53,27 @@ def test_get_stats_with_db(mock_load_model, tmp_path):
     assert stats["by_animal_type"][0]["animal_type"] == "Cat"
 
 
-@patch("src.classifier.load_model")
+@patch("classifier.load_model")
 def test_close_with_db(mock_load_model, tmp_path):
-    """Test that close() calls the db_handler close method."""
+    """Test that close() releases the db_handler."""
     mock_model = MagicMock()
     mock_load_model.return_value = mock_model
 
     labels = make_labels(tmp_path)
     clf = AnimalClassifier("/fake/model.h5", labels)
 
-    mock_close = MagicMock()
-    clf.db_handler = MagicMock(close=mock_close)
+    mock_release = MagicMock()
+    clf.db_handler = MagicMock(release=mock_release)
 
     clf.close()
-    mock_close.assert_called_once()
+    mock_release.assert_called_once()
+    # The image decoding pool is shut down with it
+    with pytest.raises(RuntimeError):
+        clf._executor.submit(int)
 
 
-@patch("src.classifier.load_model")
-@patch("src.classifier.load_dotenv")
+@patch("classifier.load_model")
+@patch("classifier.load_env")
 def test_model_version_env(mock_env, mock_load_model, tmp_path):
     """Test model_version loads from environment variables."""
     mock_load_model.return_value = MagicMock()
@@ -70,15 +87,14 @@ def test_model_version_env(mock_env, mock_load_model, tmp_path):
     assert clf.model_version == "test-version"
 
 
-@patch("src.classifier.load_model")
-@patch("src.classifier.DatabaseHandler")
+@patch("classifier.load_model")
+@patch("classifier.DatabaseHandler")
 def test_db_connection_failure(mock_db, mock_load_model, tmp_path):
     """Test constructor behavior when database connection fails."""
     mock_load_model.return_value = MagicMock()
 
     # Force DB connection failure
-    mock_instance = mock_db.return_value
-    mock_instance.connect.side_effect = ValueError("missing env")
+    mock_db.shared.side_effect = ValueError("missing env")
 
     labels = tmp_path / "labels.txt"
     labels.write_text("0 Cat\n1 Dog")
@@ -88,14 +104,14 @@ def test_db_connection_failure(mock_db, mock_load_model, tmp_path):
     assert clf.db_handler is None
 
 
-@patch("src.classifier.load_model")
+@patch("classifier.load_model")
 def test_predict_ioerror(mock_load_model, tmp_path):
     """Test predict() error return when preprocess_image raises ValueError."""
 
     mock_model = MagicMock()
 
     # Force preprocess_image to raise ValueError
-    with patch("src.classifier.AnimalClassifier.preprocess_image") as mock_prep:
+    with patch("classifier.AnimalClassifier.preprocess_image") as mock_prep:
         mock_prep.side_effect = ValueError("bad image")
 
         labels = tmp_path / "labels.txt"
@@ -109,7 +125,7 @@ def test_predict_ioerror(mock_load_model, tmp_path):
         assert result["error"] == "bad image"
 
 
-@patch("src.classifier.load_model")
+@patch("classifier.load_model")
 def test_get_stats_no_db(mock_load_model, tmp_path):
     """Test get_stats() returns None when DB is disabled."""
     mock_load_model.return_value = MagicMock()
@@ -124,7 +140,7 @@ def test_get_stats_no_db(mock_load_model, tmp_path):
     assert clf.get_stats() is None
 
 
-@patch("src.classifier.load_model")
+@patch("classifier.load_model")
 def test_close_no_db(mock_load_model, tmp_path):
     """Test close() safely does nothing when db_handler is None."""
     mock_load_model.return_value = MagicMock()
@@ -139,20 +155,20 @@ def test_close_no_db(mock_load_model, tmp_path):
     clf.close()
 
 
-@patch("src.classifier.load_model")
-@patch("src.classifier.DatabaseHandler")
+@patch("classifier.load_model")
+@patch("classifier.DatabaseHandler")
 def test_predict_saves_to_db(mock_db, mock_load_model, tmp_path):
     """
     Ensure that predict() calls save_classification() when database is connected.
     """
     # Mock model
     mock_model = MagicMock()
-    mock_model.predict.return_value = np.array([[0.3, 0.7]])
+    mock_model.return_value = np.array([[0.3, 0.7]])
     mock_load_model.return_value = mock_model
 
     # Mock DB handler
-    mock_db_instance = mock_db.return_value
-    mock_db_instance.connect.return_value = True
+    mock_db_instance = mock_db.shared.return_value
+    mock_db_instance.connected = True
     mock_db_instance.save_classification.return_value = 42
 
     # Create labels file
@@ -174,18 +190,18 @@ def test_predict_saves_to_db(mock_db, mock_load_model, tmp_path):
     assert result["db_id"] == "42"
 
 
-@patch("src.classifier.load_model")
-@patch("src.classifier.DatabaseHandler")
+@patch("classifier.load_model")
+@patch("classifier.DatabaseHandler")
 def test_predict_db_enabled_but_save_returns_none(mock_db, mock_load_model, tmp_path):
     """
     Covers branch where DB handler returns None.
     """
     mock_model = MagicMock()
-    mock_model.predict.return_value = np.array([[0.9, 0.1]])
+    mock_model.return_value = np.array([[0.9, 0.1]])
     mock_load_model.return_value = mock_model
 
-    mock_db_instance = mock_db.return_value
-    mock_db_instance.connect.return_value = True
+    mock_db_instance = mock_db.shared.return_value
+    mock_db_instance.connected = True
     mock_db_instance.save_classification.return_value = None
 
     labels = tmp_path / "labels.txt"
@@ -199,17 +215,18 @@ def test_predict_db_enabled_but_save_returns_none(mock_db, mock_load_model, tmp_
     clf = AnimalClassifier(model_path="/fake/model.h5", labels_path=str(labels))
     result = clf.predict(str(img_path))
 
+    assert "all_predictions" not in result
     assert "db_id" in result
     assert result["db_id"] is None
 
 
-@patch("src.classifier.load_model")
+@patch("classifier.load_model")
 def test_predict_all_predictions_structure(mock_load_model, tmp_path):
     """
     Covers lines building the all_predictions dictionary.
     """
     mock_model = MagicMock()
-    mock_model.predict.return_value = np.array([[0.4, 0.6]])
+    mock_model.return_value = np.array([[0.4, 0.6]])
     mock_load_model.return_value = mock_model
 
     labels = tmp_path / "labels.txt"
@@ -225,7 +242,7 @@ def test_predict_all_predictions_structure(mock_load_model, tmp_path):
     clf.db_connected = False
     clf.db_handler = None
 
-    res = clf.predict(str(img_path))
+    res = clf.predict(str(img_path), return_all_predictions=True)
 
     assert res["all_predictions"] == {"0 Cat": 0.4, "1 Dog": 0.6}
     assert len(res["all_predictions"]) == 2
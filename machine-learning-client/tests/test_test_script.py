@@ -27,11 +27,38 @@ def test_main_runs(mock_classifier):
         test_script.main("fake_path.jpg")
 
     mock_instance.predict.assert_called_once_with("fake_path.jpg")
+    mock_instance.close.assert_called_once_with()
 
     assert "Class: Dog" in captured[0]
     assert "Confidence:" in captured[1]
 
 
+@patch("src.test.AnimalClassifier")
+def test_classify_many_loads_model_once(mock_classifier):
+    """Test classify_many() builds one classifier and classifies in a batch."""
+    mock_instance = mock_classifier.return_value
+    mock_instance.predict_batch.return_value = [
+        {"image_path": "a.jpg", "animal_type": "Dog", "confidence": 0.95},
+        {"image_path": "b.jpg", "error": "cannot identify image file"},
+    ]
+
+    captured = []
+
+    def fake_print(*args):
+        captured.append(" ".join(map(str, args)))
+
+    with patch.object(builtins, "print", fake_print):
+        test_script.classify_many(["a.jpg", "b.jpg"])
+
+    mock_classifier.assert_called_once_with()
+    mock_instance.predict_batch.assert_called_once_with(["a.jpg", "b.jpg"])
+    mock_instance.close.assert_called_once_with()
+    assert captured == [
+        "a.jpg: Dog (0.95)",
+        "b.jpg: error: cannot identify image file",
+    ]
+
+
 def test_main_importable():
     """Test import does not error."""
     import src.test
@@ -4,246 +4,411 @@ Unit tests for MLWorker in worker.py
 
 # pylint: skip-file
 import os
-import sys
-from unittest.mock import Mock, patch, MagicMock
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from unittest.mock import MagicMock, Mock, PropertyMock, patch
 import pytest
 from bson.objectid import ObjectId
+from pymongo import CursorType
+from pymongo.errors import AutoReconnect, OperationFailure
 
+import worker as worker_module
+from worker import MLWorker
 
-sys.path.insert(0, os.path.join(os.path.dirname(__file__), "../src"))
+PREDICTION = {
+    "animal_type": "cat",
+    "confidence": 0.88,
+    "processing_time_ms": 100,
+    "all_predictions": {"cat": 0.88},
+    "model_version": "v1.0",
+}
 
-from worker import MLWorker
+
+@pytest.fixture(scope="module")
+def ml_worker(mock_mongo):
+    """Builds one MLWorker for the module with a mocked classifier."""
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setenv("MONGO_URI", "mongodb://fake")
+        mp.setenv("MONGO_DBNAME", "animal_classifier")
+        mp.setattr(worker_module, "AnimalClassifier", Mock)
+        ml_worker = MLWorker(poll_interval=0)
+    yield ml_worker
+    ml_worker.close()
+
+
+@pytest.fixture(autouse=True)
+def reset_worker(ml_worker):
+    """Gives each test an empty photos collection and a fresh classifier."""
+    ml_worker.photos_collection.delete_many({})
+    ml_worker.classifier.reset_mock(return_value=True, side_effect=True)
+    ml_worker.classifier.predict_batch.return_value = [dict(PREDICTION)]
 
 
 @pytest.fixture
-def sample_photo():
-    """Provides a sample photo document with an ObjectId and fake file path."""
-    return {"_id": ObjectId(), "filepath": "/fake/path.jpg", "filename": "test.jpg"}
+def photos(ml_worker):
+    """Provides the in-memory photos collection the worker reads from."""
+    return ml_worker.photos_collection
 
 
 @pytest.fixture
-def mock_classifier():
-    """Provides a mocked classifier object with a predictable predict() response."""
-    classifier = Mock()
-    classifier.predict.return_value = {
-        "animal_type": "dog",
-        "confidence": 0.95,
-        "processing_time_ms": 123,
-        "all_predictions": {"dog": 0.95},
-        "model_version": "v1.0",
-    }
-    classifier.close = Mock()
-    return classifier
+def mock_classifier(ml_worker):
+    """Provides the worker's mocked classifier."""
+    return ml_worker.classifier
 
 
 @pytest.fixture
-def mock_mongo_client():
-    """Provides a mocked MongoDB client, database, and photos collection."""
-    client = MagicMock()
-    db = MagicMock()
-    photos = MagicMock()
-    client.__getitem__.return_value = db
-    db.__getitem__.return_value = photos
-    return client, db, photos
-
-
-@patch("worker.pymongo.MongoClient")
-@patch("worker.AnimalClassifier")
-def test_init_success(mock_classifier_class, mock_mongo_client_class):
+def sample_photo(photos):
+    """Provides a pending photo document stored with a fake file path."""
+    photo = {
+        "_id": ObjectId(),
+        "filepath": "/fake/path.jpg",
+        "filename": "test.jpg",
+        "status": "pending",
+    }
+    photos.insert_one(photo)
+    return photo
+
+
+def test_init_success(ml_worker, mock_mongo):
     """Test MLWorker initialization."""
-    mock_classifier_class.return_value = Mock()
-    mock_client_instance = MagicMock()
-    mock_mongo_client_class.return_value = mock_client_instance
-
-    with patch.dict(os.environ, {"MONGO_URI": "mongodb://fake"}):
-        worker = MLWorker(poll_interval=0)
-        assert worker.poll_interval == 0
-        assert worker.classifier is not None
-        assert worker.photos_collection is not None
-        worker.close()
-
-
-@patch("worker.pymongo.MongoClient")
-@patch("worker.AnimalClassifier")
-def test_process_photo_success(
-    mock_classifier_class, mock_mongo_client_class, sample_photo
-):
-    """Test normal photo processing branch."""
-    mock_classifier = Mock()
-    mock_classifier.predict.return_value = {
-        "animal_type": "cat",
-        "confidence": 0.88,
-        "processing_time_ms": 100,
-        "all_predictions": {"cat": 0.88},
-        "model_version": "v1.0",
+    assert ml_worker.poll_interval == 0
+    assert ml_worker.classifier is not None
+    assert ml_worker.client is mock_mongo
+    assert ml_worker.photos_collection.full_name == "animal_classifier.photos"
+
+
+def test_init_creates_partial_status_indexes(ml_worker):
+    """Test the pending and processing indexes only cover those statuses."""
+    indexes = ml_worker.photos_collection.index_information()
+    assert indexes["pending"]["partialFilterExpression"] == {"status": "pending"}
+    assert indexes["processing_claimed_at"]["partialFilterExpression"] == {
+        "status": "processing"
     }
-    mock_classifier.close = Mock()
-    mock_classifier_class.return_value = mock_classifier
-
-    mock_client_instance = MagicMock()
-    mock_db = MagicMock()
-    mock_photos = MagicMock()
-    mock_photos.update_one.return_value.modified_count = 1
-    mock_client_instance.__getitem__.return_value = mock_db
-    mock_db.__getitem__.return_value = mock_photos
-    mock_mongo_client_class.return_value = mock_client_instance
-
-    with patch.dict(os.environ, {"MONGO_URI": "mongodb://fake"}), patch(
-        "os.path.exists", return_value=True
-    ):
-        worker = MLWorker(poll_interval=0)
-        worker._process_photo(sample_photo)
-        mock_photos.update_one.assert_called()
-        worker.close()
 
 
-@patch("worker.pymongo.MongoClient")
-@patch("worker.AnimalClassifier")
-def test_process_photo_missing_filepath(mock_classifier_class, mock_mongo_client_class):
+def test_process_photo_success(ml_worker, mock_classifier, photos, sample_photo):
+    """Test normal photo processing branch."""
+    ml_worker._process_photo(sample_photo)
+    mock_classifier.predict_batch.assert_called_once_with(
+        ["/fake/path.jpg"],
+        batch_size=32,
+        save_to_db=False,
+        return_all_predictions=True,
+    )
+
+    doc = photos.find_one({"_id": sample_photo["_id"]})
+    assert doc["status"] == "done"
+    assert doc["animal_type"] == "cat"
+    assert doc["all_predictions"] == {"cat": 0.88}
+
+
+def test_process_photo_missing_filepath(ml_worker, mock_classifier, photos):
     """Test photo doc without filepath triggers failure."""
-    photo = {"_id": ObjectId(), "filename": "nofile.jpg"}
-    mock_classifier_class.return_value = Mock()
-
-    mock_client_instance = MagicMock()
-    mock_db = MagicMock()
-    mock_photos = MagicMock()
-    mock_client_instance.__getitem__.return_value = mock_db
-    mock_db.__getitem__.return_value = mock_photos
-    mock_mongo_client_class.return_value = mock_client_instance
-
-    with patch.dict(os.environ, {"MONGO_URI": "mongodb://fake"}):
-        worker = MLWorker(poll_interval=0)
-        worker._process_photo(photo)
-        # _mark_failed should call update_one
-        mock_photos.update_one.assert_called()
-        worker.close()
-
-
-@patch("worker.pymongo.MongoClient")
-@patch("worker.AnimalClassifier")
-def test_process_photo_file_not_exist(
-    mock_classifier_class, mock_mongo_client_class, sample_photo
+    photo = {"_id": ObjectId(), "filename": "nofile.jpg", "status": "pending"}
+    photos.insert_one(photo)
+
+    ml_worker._process_photo(photo)
+
+    doc = photos.find_one({"_id": photo["_id"]})
+    assert doc["status"] == "failed"
+    assert doc["error"] == "No filepath provided"
+
+
+@pytest.mark.parametrize(
+    "predict, error",
+    [
+        (
+            {"return_value": [{"error": "[Errno 2] No such file or directory"}]},
+            "[Errno 2] No such file or directory",
+        ),
+        ({"return_value": [{"error": "Failed"}]}, "Failed"),
+        ({"side_effect": Exception("Unexpected")}, "Unexpected"),
+    ],
+    ids=["file_not_exist", "predict_error", "predict_exception"],
+)
+def test_process_photo_failed(
+    ml_worker, mock_classifier, photos, sample_photo, predict, error
 ):
-    """Test photo processing when file does not exist."""
-    mock_classifier_class.return_value = Mock()
-
-    mock_client_instance = MagicMock()
-    mock_db = MagicMock()
-    mock_photos = MagicMock()
-    mock_client_instance.__getitem__.return_value = mock_db
-    mock_db.__getitem__.return_value = mock_photos
-    mock_mongo_client_class.return_value = mock_client_instance
-
-    with patch.dict(os.environ, {"MONGO_URI": "mongodb://fake"}), patch(
-        "os.path.exists", return_value=False
-    ):
-        worker = MLWorker(poll_interval=0)
-        worker._process_photo(sample_photo)
-        mock_photos.update_one.assert_called()
-        worker.close()
+    """Test each failure branch of _process_photo marks the photo failed."""
+    mock_classifier.predict_batch.configure_mock(**predict)
 
+    ml_worker._process_photo(sample_photo)
 
-@patch("worker.pymongo.MongoClient")
-@patch("worker.AnimalClassifier")
-def test_process_photo_predict_error(
-    mock_classifier_class, mock_mongo_client_class, sample_photo
-):
-    """Test processing when classifier.predict returns an error."""
-    mock_classifier = Mock()
-    mock_classifier.predict.return_value = {"error": "Failed"}
-    mock_classifier_class.return_value = mock_classifier
-
-    mock_client_instance = MagicMock()
-    mock_db = MagicMock()
-    mock_photos = MagicMock()
-    mock_client_instance.__getitem__.return_value = mock_db
-    mock_db.__getitem__.return_value = mock_photos
-    mock_mongo_client_class.return_value = mock_client_instance
-
-    with patch.dict(os.environ, {"MONGO_URI": "mongodb://fake"}), patch(
-        "os.path.exists", return_value=True
-    ):
-        worker = MLWorker(poll_interval=0)
-        worker._process_photo(sample_photo)
-        mock_photos.update_one.assert_called()
-        worker.close()
-
-
-@patch("worker.pymongo.MongoClient")
-@patch("worker.AnimalClassifier")
-def test_mark_failed_exception(mock_classifier_class, mock_mongo_client_class):
-    """Test _mark_failed handles update_one exception."""
-    mock_classifier_class.return_value = Mock()
-
-    mock_client_instance = MagicMock()
-    mock_db = MagicMock()
-    mock_photos = MagicMock()
-    mock_photos.update_one.side_effect = Exception("DB fail")
-    mock_client_instance.__getitem__.return_value = mock_db
-    mock_db.__getitem__.return_value = mock_photos
-    mock_mongo_client_class.return_value = mock_client_instance
-
-    with patch.dict(os.environ, {"MONGO_URI": "mongodb://fake"}):
-        worker = MLWorker(poll_interval=0)
-        worker._mark_failed(ObjectId(), "Error")
-        mock_photos.update_one.assert_called()
-        worker.close()
-
-
-@patch("worker.pymongo.MongoClient")
-@patch("worker.AnimalClassifier")
-def test_process_photo_update_not_modified(
-    mock_classifier_class, mock_mongo_client_class, sample_photo
-):
+    doc = photos.find_one({"_id": sample_photo["_id"]})
+    assert doc["status"] == "failed"
+    assert doc["error"] == error
+    mock_classifier.predict_batch.assert_called_once()
+
+
+def test_process_batch_write_exception(ml_worker, sample_photo):
+    """Test _process_batch handles a bulk_write the server rejects."""
+    with patch.object(
+        ml_worker.photos_collection,
+        "bulk_write",
+        side_effect=OperationFailure("DB fail"),
+    ) as bulk_write:
+        ml_worker._process_batch([sample_photo])
+        bulk_write.assert_called_once()
+
+
+def test_process_batch_lost_connection_propagates(ml_worker, sample_photo):
+    """Test a lost connection at write time reaches the loop's retry backoff."""
+    with patch.object(
+        ml_worker.photos_collection, "bulk_write", side_effect=AutoReconnect("down")
+    ), pytest.raises(AutoReconnect):
+        ml_worker._process_batch([sample_photo])
+
+
+def test_process_batch_single_write(ml_worker, mock_classifier, photos, sample_photo):
+    """Test a batch runs one predict_batch call and one bulk_write, at one time."""
+    missing = {"_id": ObjectId(), "filename": "nofile.jpg", "status": "pending"}
+    photos.insert_one(missing)
+
+    with patch.object(photos, "bulk_write", wraps=photos.bulk_write) as bulk_write:
+        ml_worker._process_batch([sample_photo, missing])
+
+    bulk_write.assert_called_once()
+    mock_classifier.predict_batch.assert_called_once()
+    assert mock_classifier.predict_batch.call_args[0][0] == ["/fake/path.jpg"]
+    done = photos.find_one({"_id": sample_photo["_id"]})
+    failed = photos.find_one({"_id": missing["_id"]})
+    assert done["status"] == "done"
+    assert failed["status"] == "failed"
+    assert done["updated_at"] == failed["updated_at"]
+
+
+def test_process_photo_update_not_modified(ml_worker, mock_classifier, photos):
     """Test the branch where update_one.modified_count == 0"""
-    mock_classifier = Mock()
-    mock_classifier.predict.return_value = {
-        "animal_type": "cat",
-        "confidence": 0.88,
-        "processing_time_ms": 100,
-        "all_predictions": {"cat": 0.88},
-        "model_version": "v1.0",
-    }
-    mock_classifier.close = Mock()
-    mock_classifier_class.return_value = mock_classifier
-
-    mock_client_instance = MagicMock()
-    mock_db = MagicMock()
-    mock_photos = MagicMock()
-    mock_photos.update_one.return_value.modified_count = 0  # triggers else branch
-    mock_client_instance.__getitem__.return_value = mock_db
-    mock_db.__getitem__.return_value = mock_photos
-    mock_mongo_client_class.return_value = mock_client_instance
-
-    with patch.dict(os.environ, {"MONGO_URI": "mongodb://fake"}), patch(
-        "os.path.exists", return_value=True
-    ):
-        worker = MLWorker(poll_interval=0)
-        worker._process_photo(sample_photo)
-        worker.close()
+    # The photo is not stored, so the update matches nothing
+    photo = {"_id": ObjectId(), "filepath": "/fake/path.jpg", "filename": "gone.jpg"}
 
+    ml_worker._process_photo(photo)
 
-@patch("worker.pymongo.MongoClient")
-@patch("worker.AnimalClassifier")
-def test_process_photo_exception_logging(
-    mock_classifier_class, mock_mongo_client_class, sample_photo
-):
-    """Test exception inside _process_photo triggers _mark_failed"""
-    mock_classifier = Mock()
-    mock_classifier.predict.side_effect = Exception("Unexpected")
-    mock_classifier_class.return_value = mock_classifier
-
-    mock_client_instance = MagicMock()
-    mock_db = MagicMock()
-    mock_photos = MagicMock()
-    mock_client_instance.__getitem__.return_value = mock_db
-    mock_db.__getitem__.return_value = mock_photos
-    mock_mongo_client_class.return_value = mock_client_instance
-
-    with patch.dict(os.environ, {"MONGO_URI": "mongodb://fake"}), patch(
-        "os.path.exists", return_value=True
+    assert photos.count_documents({}) == 0
+
+
+def test_process_pending_falls_back_to_tailing_then_polling(ml_worker, photos):
+    """Test a server without change streams tails photo_jobs, else is polled."""
+    with patch.object(
+        photos, "watch", side_effect=OperationFailure("not a replica set", 40573)
+    ), patch.object(
+        ml_worker, "_tail_photo_jobs", return_value=False
+    ) as tail, patch.object(
+        ml_worker, "_poll_pending_photos"
+    ) as poll:
+        ml_worker.process_pending_photos()
+
+    tail.assert_called_once()
+    poll.assert_called_once()
+
+
+def test_stream_operation_failure_is_retried(ml_worker, photos, monkeypatch):
+    """Test other errors while following the stream retry it, not fall back."""
+    sleep = Mock(side_effect=[None, KeyboardInterrupt])
+    monkeypatch.setattr(worker_module.time, "sleep", sleep)
+    with patch.object(
+        photos, "watch", side_effect=OperationFailure("write concern error", 64)
+    ) as watch, patch.object(ml_worker, "_tail_photo_jobs") as tail, pytest.raises(
+        KeyboardInterrupt
+    ):
+        ml_worker.process_pending_photos()
+
+    assert watch.call_count == 2
+    tail.assert_not_called()
+
+
+def test_tail_photo_jobs_processes_queued_jobs(ml_worker, monkeypatch):
+    """Test jobs the tailable cursor has received are claimed in one batch."""
+    photo_ids = [ObjectId(), ObjectId()]
+    jobs = [{"_id": ObjectId(), "photo_id": photo_id} for photo_id in photo_ids]
+
+    cursor = MagicMock()
+    cursor.max_await_time_ms.return_value = cursor
+    cursor.__enter__.return_value = cursor
+    cursor.__next__.side_effect = [*jobs, StopIteration]
+    cursor.retrieved = len(jobs)
+    type(cursor).alive = PropertyMock(side_effect=[True, True, False])
+
+    monkeypatch.setattr(
+        worker_module.time, "sleep", Mock(side_effect=KeyboardInterrupt)
+    )
+    with patch.object(
+        ml_worker.photo_jobs, "options", return_value={"capped": True}
+    ), patch.object(ml_worker.photo_jobs, "find_one", return_value=None), patch.object(
+        ml_worker.photo_jobs, "find", return_value=cursor
+    ) as find, patch.object(
+        ml_worker, "_claim_and_process"
+    ) as claim_and_process, pytest.raises(
+        KeyboardInterrupt
     ):
-        worker = MLWorker(poll_interval=0)
-        worker._process_photo(sample_photo)
-        mock_photos.update_one.assert_called()  # ensure _mark_failed called
-        worker.close()
+        ml_worker._tail_photo_jobs()
+
+    assert find.call_args.args[0] == {}
+    assert find.call_args.kwargs["cursor_type"] == CursorType.TAILABLE_AWAIT
+    claim_and_process.assert_called_once_with([{"_id": i} for i in photo_ids])
+
+
+def test_tail_photo_jobs_needs_capped_collection(ml_worker):
+    """Test tailing reports itself unavailable when photo_jobs is not capped."""
+    with patch.object(ml_worker.photo_jobs, "options", return_value={}):
+        assert ml_worker._tail_photo_jobs() is False
+
+
+def test_watch_processes_backlog_then_events(ml_worker, photos, sample_photo):
+    """Test queued photos are drained, then waiting events are batched."""
+    first = {"_id": ObjectId(), "filepath": "/a.jpg", "status": "pending"}
+    second = {"_id": ObjectId(), "filepath": "/b.jpg", "status": "pending"}
+
+    def events():
+        # Both photos arrive after the backlog has been drained
+        photos.insert_many([first, second])
+        yield {"fullDocument": first}
+
+    stream = MagicMock()
+    stream.__enter__.return_value = stream
+    stream.__iter__.return_value = events()
+    # Only the second event is already buffered when the first is handled
+    stream._cursor._has_next.side_effect = [True, False]
+    stream.try_next.return_value = {"fullDocument": second}
+
+    with patch.object(photos, "watch", return_value=stream) as watch, patch.object(
+        ml_worker, "_process_batch"
+    ) as process_batch:
+        assert ml_worker._watch_pending_photos() is True
+
+    assert watch.call_args.kwargs["full_document"] == "updateLookup"
+    stream.try_next.assert_called_once()
+    batches = [[doc["_id"] for doc in c.args[0]] for c in process_batch.call_args_list]
+    assert batches == [[sample_photo["_id"]], [first["_id"], second["_id"]]]
+
+
+def test_has_buffered_without_private_cursor():
+    """Test a stream lacking pymongo's private cursor is never batched."""
+    assert worker_module._has_buffered(object()) is False
+
+
+def test_claim_skips_photos_claimed_elsewhere(ml_worker, photos, sample_photo):
+    """Test only photos still pending are claimed, and they become processing."""
+    taken = {"_id": ObjectId(), "status": "processing", "worker_id": "other"}
+    photos.insert_one(taken)
+
+    claimed = ml_worker._claim([sample_photo["_id"], taken["_id"]])
+
+    assert [doc["_id"] for doc in claimed] == [sample_photo["_id"]]
+    assert claimed[0]["status"] == "processing"
+    assert claimed[0]["worker_id"] == ml_worker.worker_id
+    assert photos.find_one({"_id": taken["_id"]})["worker_id"] == "other"
+
+
+def test_release_stale_claims(ml_worker, photos):
+    """Test old claims and this worker's own go back to pending."""
+    now = datetime.utcnow()
+    stale = {
+        "_id": ObjectId(),
+        "status": "processing",
+        "claimed_at": now - timedelta(hours=1),
+    }
+    fresh = {"_id": ObjectId(), "status": "processing", "claimed_at": now}
+    own = {
+        "_id": ObjectId(),
+        "status": "processing",
+        "claimed_at": now,
+        "worker_id": ml_worker.worker_id,
+    }
+    photos.insert_many([stale, fresh, own])
+
+    ml_worker._release_stale_claims()
+
+    assert photos.find_one({"_id": own["_id"]})["status"] == "pending"
+
+    assert photos.find_one({"_id": stale["_id"]})["status"] == "pending"
+    assert "claimed_at" not in photos.find_one({"_id": stale["_id"]})
+    assert photos.find_one({"_id": fresh["_id"]})["status"] == "processing"
+
+
+def test_release_stale_claims_is_indexed(ml_worker, photos):
+    """Test every $or branch of the sweep has a partial index to use."""
+    with patch.object(photos, "update_many") as update_many:
+        update_many.return_value.modified_count = 0
+        ml_worker._release_stale_claims()
+
+    query = update_many.call_args.args[0]
+    indexes = photos.index_information().values()
+    for branch in query["$or"]:
+        (field,) = branch
+        assert any(
+            index["key"][0][0] == field
+            and index.get("partialFilterExpression") == {"status": query["status"]}
+            for index in indexes
+        ), field
+
+
+def test_poll_backs_off_while_idle(ml_worker, photos, monkeypatch):
+    """Test idle polls wait twice as long each time, capped at poll_interval."""
+    monkeypatch.setattr(ml_worker, "poll_interval", 1)
+    delays = []
+
+    def sleep(seconds):
+        delays.append(seconds)
+        if len(delays) == 4:
+            photos.insert_one({"_id": ObjectId(), "status": "pending"})
+        if len(delays) == 6:
+            raise KeyboardInterrupt
+
+    monkeypatch.setattr(worker_module.time, "sleep", sleep)
+    with patch.object(ml_worker, "_claim_and_process") as claim_and_process:
+        claim_and_process.side_effect = lambda docs: photos.delete_many({})
+        with pytest.raises(KeyboardInterrupt):
+            ml_worker._poll_pending_photos()
+
+    assert delays == [0.25, 0.5, 1, 1, 0.25, 0.5]
+
+
+def test_lost_connection_backs_off(ml_worker, monkeypatch):
+    """Test consecutive lost connections double the retry wait up to a cap."""
+    monkeypatch.setattr(worker_module, "MAX_RETRY_DELAY", 5)
+    delays = []
+
+    def sleep(seconds):
+        delays.append(seconds)
+        if len(delays) == 4:
+            raise KeyboardInterrupt
+
+    monkeypatch.setattr(worker_module.time, "sleep", sleep)
+    with patch.object(
+        ml_worker, "_watch_pending_photos", side_effect=AutoReconnect("down")
+    ), pytest.raises(KeyboardInterrupt):
+        ml_worker.process_pending_photos()
+
+    assert delays == [2, 4, 5, 5]
+
+
+def test_unexpected_error_is_not_retried(ml_worker):
+    """Test errors that are not from MongoDB or the OS stop the worker loop."""
+    with patch.object(
+        ml_worker, "_watch_pending_photos", side_effect=ValueError("bug")
+    ), pytest.raises(ValueError):
+        ml_worker.process_pending_photos()
+
+
+def test_log_listener_forwards_records(monkeypatch):
+    """Test log records reach the original handlers through the listener thread"""
+    import logging
+
+    root = logging.getLogger()
+    records = []
+    handler = SimpleNamespace(level=logging.NOTSET, handle=records.append)
+    monkeypatch.setattr(root, "handlers", [handler])
+
+    listener = worker_module._start_log_listener()
+    assert isinstance(root.handlers[0], logging.handlers.QueueHandler)
+    worker_module.logger.warning("queued %s", "record")
+    listener.stop()
+
+    assert [record.getMessage() for record in records] == ["queued record"]
+
+
+def test_sigterm_stops_like_keyboard_interrupt():
+    """Test SIGTERM raises KeyboardInterrupt so the shutdown paths run."""
+    with pytest.raises(KeyboardInterrupt):
+        worker_module._stop_on_sigterm(15, None)
@@ -2,9 +2,15 @@
 
 import os
 import datetime
+import functools
+import hmac
+import shutil
+import tempfile
+import time
 
 from flask import (
     Flask,
+    Request,
     render_template,
     request,
     redirect,
@@ -12,6 +18,7 @@ from flask import (
     flash,
     send_from_directory,
 )
+from jinja2 import FileSystemBytecodeCache
 from flask_login import (
     LoginManager,
     login_user,
@@ -19,24 +26,127 @@ from flask_login import (
     login_required,
     current_user,
 )
-from pymongo import MongoClient
+from pymongo import MongoClient, WriteConcern
+from pymongo.errors import CollectionInvalid, DuplicateKeyError, OperationFailure
+from werkzeug.security import check_password_hash, generate_password_hash
 from werkzeug.utils import secure_filename
 from bson.objectid import ObjectId
 
-
 app = Flask(__name__)
 app.secret_key = os.environ.get("SECRET_KEY", "changethiskey")
+# Larger uploads are rejected with 413 before anything is written to disk
+app.config["MAX_CONTENT_LENGTH"] = 16 * 1024 * 1024
+# Behind nginx/Apache, let the proxy send upload files with sendfile(2)
+# instead of streaming them through a Flask worker
+app.config["USE_X_SENDFILE"] = os.environ.get("USE_X_SENDFILE") in ("1", "true")
+# Static files (the stylesheet) are cached for an hour, then revalidated by ETag
+app.config["SEND_FILE_MAX_AGE_DEFAULT"] = 3600
+# Compiled templates are kept in the temp dir so restarted workers skip parsing
+app.jinja_env.bytecode_cache = FileSystemBytecodeCache()
 
 MONGO_URI = os.environ.get("MONGO_URI", "mongodb://localhost:27017/")
-client = MongoClient(MONGO_URI)
-db = client["animal_classifier"]
-photos_collection = db["photos"]
-users_collection = db["users"]
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 UPLOAD_FOLDER = os.path.join(BASE_DIR, "uploads")
 
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+# Photo fields the home and my_animals templates render
+PHOTO_LIST_FIELDS = {
+    "filename": 1,
+    "animal_type": 1,
+    "confidence": 1,
+    "status": 1,
+    "created_at": 1,
+}
+MY_ANIMALS_PAGE_SIZE = 50
+# Uploads are copied to disk in 64 KiB reads through a 1 MiB write buffer
+UPLOAD_CHUNK_SIZE = 64 * 1024
+UPLOAD_BUFFER_SIZE = 1024 * 1024
+# Saved uploads are named "<timestamp>_<original name>"
+UPLOAD_TIMESTAMP_FORMAT = "%Y%m%d_%H%M%S"
+# Photo metadata is acknowledged by the primary without waiting for the
+# journal; the image itself is already on disk
+PHOTO_WRITE_CONCERN = WriteConcern(w=1, j=False)
+# Each upload also queues a job in this capped collection, which the worker
+# tails when the server has no change streams
+PHOTO_JOBS_SIZE = 1024 * 1024
+# Browsers may cache a served upload for a year
+UPLOAD_MAX_AGE = 365 * 24 * 60 * 60
+# load_user reuses a loaded user for this many seconds across requests
+USER_CACHE_TTL = 30
+USER_CACHE_MAX = 1024
+_user_cache: dict = {}
+# Login only needs the username and whichever password field the user has
+LOGIN_FIELDS = {"username": 1, "password_hash": 1, "password": 1}
+# scrypt with werkzeug's default cost; hashes made with anything else are
+# replaced on the user's next successful login
+PASSWORD_HASH_METHOD = "scrypt:32768:8:1"
+
+
+class UploadRequest(Request):
+    """Request that spools uploaded files straight into UPLOAD_FOLDER."""
+
+    def _get_file_stream(
+        self, total_content_length, content_type, filename=None, content_length=None
+    ):
+        """Write each uploaded file to a temp file beside its final path."""
+        os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+        spool = tempfile.NamedTemporaryFile(  # pylint: disable=consider-using-with
+            "wb+", buffering=UPLOAD_BUFFER_SIZE, dir=UPLOAD_FOLDER, prefix=".upload-"
+        )
+        os.fchmod(spool.fileno(), 0o644)
+        return spool
+
+
+app.request_class = UploadRequest
+
+
+def save_upload(stream, save_path: str):
+    """Save an uploaded file, raising FileExistsError rather than overwrite."""
+    spooled = getattr(stream, "name", None)
+    if isinstance(spooled, str):
+        stream.flush()
+        try:
+            # The upload is already on this disk; linking it copies nothing
+            os.link(spooled, save_path)
+            return
+        except FileExistsError:
+            raise
+        except OSError:
+            pass  # No hard links here (or another disk); copy instead
+    # O_EXCL refuses to overwrite a file already saved under this name
+    fd = os.open(save_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+    with open(fd, "wb", buffering=UPLOAD_BUFFER_SIZE) as out:
+        shutil.copyfileobj(stream, out, length=UPLOAD_CHUNK_SIZE)
+
+
+@functools.lru_cache(maxsize=1)
+def get_db():
+    """Return the app database, creating the MongoClient on first use."""
+    # Created lazily, so each forked server process builds its own pool
+    client = MongoClient(
+        MONGO_URI,
+        maxPoolSize=20,
+        minPoolSize=2,
+        connect=False,
+        serverSelectionTimeoutMS=2000,
+    )
+    db = client["animal_classifier"]
+    try:
+        # Serves home() and my_animals() without an in-memory sort
+        db["photos"].create_index(
+            [("user_id", 1), ("created_at", -1)], name="user_recent"
+        )
+        db["users"].create_index("username", unique=True, name="username_unique")
+    except OperationFailure as error:
+        app.logger.warning("Could not create indexes: %s", error)
+    try:
+        db.create_collection("photo_jobs", capped=True, size=PHOTO_JOBS_SIZE)
+    except CollectionInvalid:
+        pass  # Already created by the worker or another server process
+    except OperationFailure as error:
+        app.logger.warning("Could not create photo_jobs: %s", error)
+    return db
+
 
 login_manager = LoginManager()
 login_manager.login_view = "login"
@@ -48,7 +158,8 @@ class User:
 
     def __init__(self, user_doc: dict):
         """Initialize user from MongoDB document."""
-        self.id = str(user_doc["_id"])
+        self.oid = user_doc["_id"]
+        self.id = str(self.oid)
         self.username = user_doc.get("username", "")
 
     @property
@@ -74,34 +185,63 @@ class User:
 @login_manager.user_loader
 def load_user(user_id: str):
     """Load user by ID for Flask-Login."""
-    doc = users_collection.find_one({"_id": ObjectId(user_id)})
-    return User(doc) if doc else None
-
-
-@app.route("/style.css")
-def serve_css():
-    """Serve the CSS stylesheet from templates directory."""
-    css_path = os.path.join(app.root_path, "templates", "styles.css")
-    try:
-        with open(css_path, "r", encoding="utf-8") as f:
-            css_content = f.read()
-        response = app.make_response(css_content)
-        response.headers["Content-Type"] = "text/css"
-        response.headers["Cache-Control"] = "public, max-age=3600"
-        return response
-    except FileNotFoundError:
-        return "/* CSS file not found */", 404, {"Content-Type": "text/css"}
+    cached = _user_cache.get(user_id)
+    if cached and cached[0] > time.monotonic():
+        return cached[1]
+
+    # Flask-Login calls this at most once per request; User needs only these
+    doc = get_db()["users"].find_one({"_id": ObjectId(user_id)}, {"username": 1})
+    user = User(doc) if doc else None
+    if len(_user_cache) >= USER_CACHE_MAX:
+        _user_cache.clear()
+    _user_cache[user_id] = (time.monotonic() + USER_CACHE_TTL, user)
+    return user
+
+
+def verify_password(users, user_doc: dict, password: str) -> bool:
+    """
+    Check a login password against the user's stored hash.
+
+    Accounts created before passwords were hashed still hold the plain
+    password, and older accounts may use another hash method; a matching
+    login replaces either with a PASSWORD_HASH_METHOD hash.
+    """
+    stored = user_doc.get("password_hash")
+    if stored is not None:
+        if not check_password_hash(stored, password):
+            return False
+        if stored.split("$", 1)[0] == PASSWORD_HASH_METHOD:
+            return True
+    else:
+        legacy = user_doc.get("password")
+        # compare_digest only takes ASCII str, so compare the UTF-8 bytes
+        if legacy is None or not hmac.compare_digest(
+            legacy.encode(), password.encode()
+        ):
+            return False
+    users.update_one(
+        {"_id": user_doc["_id"]},
+        {
+            "$set": {
+                "password_hash": generate_password_hash(password, PASSWORD_HASH_METHOD)
+            },
+            "$unset": {"password": ""},
+        },
+    )
+    return True
 
 
 @app.route("/")
 @login_required
 def home():
     """Display home page with recent photos."""
-    query = {"user_id": ObjectId(current_user.id)}
-    recent = list(photos_collection.find(query).sort("created_at", -1).limit(6))
-
-    for obs in recent:
-        obs["_id"] = str(obs["_id"])
+    query = {"user_id": current_user.oid}
+    recent = list(
+        get_db()["photos"]
+        .find(query, PHOTO_LIST_FIELDS)
+        .sort("created_at", -1)
+        .limit(6)
+    )
 
     return render_template("home.html", recent=recent)
 
@@ -112,8 +252,9 @@ def login():
     if request.method == "POST":
         username = request.form.get("username", "")
         password = request.form.get("password", "")
-        user = users_collection.find_one({"username": username, "password": password})
-        if user:
+        users = get_db()["users"]
+        user = users.find_one({"username": username}, LOGIN_FIELDS)
+        if user and verify_password(users, user, password):
             login_user(User(user))
             return redirect(url_for("home"))
         flash("Invalid login.")
@@ -127,16 +268,27 @@ def register():
         username = request.form.get("username", "")
         email = request.form.get("email", "")
         password = request.form.get("password", "")
-        if users_collection.find_one({"username": username}):
-            flash("Oopsie poopsie! :( That name's already taken.")
-        else:
-            users_collection.insert_one(
+        # One atomic upsert both checks for the name and creates the account
+        try:
+            result = get_db()["users"].update_one(
+                {"username": username},
                 {
-                    "username": username,
-                    "email": email,
-                    "password": password,
-                }
+                    "$setOnInsert": {
+                        "email": email,
+                        "password_hash": generate_password_hash(
+                            password, PASSWORD_HASH_METHOD
+                        ),
+                    }
+                },
+                upsert=True,
             )
+            taken = result.matched_count > 0
+        except DuplicateKeyError:
+            # A concurrent registration inserted the same name first
+            taken = True
+        if taken:
+            flash("Oopsie poopsie! :( That name's already taken.")
+        else:
             flash("Account created! Log in to your new account.")
             return redirect(url_for("login"))
     return render_template("login.html", register=True)
@@ -146,6 +298,7 @@ def register():
 @login_required
 def logout():
     """Handle user logout."""
+    _user_cache.pop(current_user.get_id(), None)
     logout_user()
     return redirect(url_for("login"))
 
@@ -160,23 +313,32 @@ def upload():
             flash("Please upload a file.")
             return redirect(request.url)
 
-        timestamp = datetime.datetime.utcnow().strftime("%Y%m%d_%H%M%S")
-        filename = secure_filename(f"{timestamp}_{file.filename}")
+        now = datetime.datetime.now(datetime.timezone.utc)
+        filename = secure_filename(f"{now:{UPLOAD_TIMESTAMP_FORMAT}}_{file.filename}")
         save_path = os.path.join(UPLOAD_FOLDER, filename)
 
-        file.save(save_path)
+        os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+        try:
+            save_upload(file.stream, save_path)
+        except FileExistsError:
+            flash("That photo is already being uploaded. Please try again.")
+            return redirect(request.url)
 
         doc = {
-            "user_id": ObjectId(current_user.id),
+            "user_id": current_user.oid,
             "filename": filename,
             "filepath": save_path,
             "animal_type": None,
             "confidence": None,
             "status": "pending",
-            "created_at": datetime.datetime.utcnow(),
-            "updated_at": datetime.datetime.utcnow(),
+            "created_at": now,
+            "updated_at": now,
         }
-        inserted = photos_collection.insert_one(doc)
+        db = get_db()
+        photos = db["photos"].with_options(write_concern=PHOTO_WRITE_CONCERN)
+        inserted = photos.insert_one(doc)
+        jobs = db["photo_jobs"].with_options(write_concern=PHOTO_WRITE_CONCERN)
+        jobs.insert_one({"photo_id": inserted.inserted_id})
 
         return redirect(url_for("your_animal", obs_id=str(inserted.inserted_id)))
 
@@ -187,7 +349,7 @@ def upload():
 @login_required
 def your_animal(obs_id: str):
     """Display single animal photo with classification results."""
-    obs = photos_collection.find_one({"_id": ObjectId(obs_id)})
+    obs = get_db()["photos"].find_one({"_id": ObjectId(obs_id)})
     if not obs:
         flash("Animal not found.")
         return redirect(url_for("home"))
@@ -198,19 +360,31 @@ def your_animal(obs_id: str):
 @login_required
 def my_animals():
     """Display all user's uploaded animal photos."""
-    query = {"user_id": ObjectId(current_user.id)}
-    observations = list(photos_collection.find(query).sort("created_at", -1))
-
-    for obs in observations:
-        obs["_id"] = str(obs["_id"])
-
-    return render_template("my_animals.html", observations=observations)
+    query = {"user_id": current_user.oid}
+    page = max(request.args.get("page", 0, type=int), 0)
+    # Fetch one extra row to learn whether an older page exists
+    observations = list(
+        get_db()["photos"]
+        .find(query, PHOTO_LIST_FIELDS)
+        .sort("created_at", -1)
+        .skip(page * MY_ANIMALS_PAGE_SIZE)
+        .limit(MY_ANIMALS_PAGE_SIZE + 1)
+    )
+    has_more = len(observations) > MY_ANIMALS_PAGE_SIZE
+    observations = observations[:MY_ANIMALS_PAGE_SIZE]
+
+    return render_template(
+        "my_animals.html", observations=observations, page=page, has_more=has_more
+    )
 
 
 @app.route("/uploads/<filename>")
 def uploaded_file(filename: str):
     """Serve uploaded photo files."""
-    return send_from_directory(UPLOAD_FOLDER, filename)
+    response = send_from_directory(UPLOAD_FOLDER, filename, max_age=UPLOAD_MAX_AGE)
+    # Saved uploads are never rewritten, so browsers need not revalidate
+    response.cache_control.immutable = True
+    return response
 
 
 if __name__ == "__main__":
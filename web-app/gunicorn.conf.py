@@ -0,0 +1,14 @@
+"""Gunicorn settings for the web app container."""
+
+# Gunicorn reads these lowercase module names
+# pylint: disable=invalid-name
+
+import os
+
+bind = "0.0.0.0:5000"
+# One process per CPU; WEB_CONCURRENCY overrides it
+workers = int(os.environ.get("WEB_CONCURRENCY", os.cpu_count() or 1))
+# Threads keep a worker serving other requests while one waits on MongoDB
+# or a slow upload
+worker_class = "gthread"
+threads = 8
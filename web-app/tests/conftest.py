@@ -0,0 +1,45 @@
+"""
+Shared pytest configuration for the web app tests.
+"""
+
+import os
+import sys
+
+import pymongo
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import app as app_module  # pylint: disable=wrong-import-position,import-error
+
+
+@pytest.fixture(scope="session", autouse=True)
+def cheap_password_hash():
+    """
+    Hash test passwords with minimal scrypt parameters.
+
+    The app's real cost makes every hash take a noticeable fraction of a
+    second; the stored format and the rehash-on-login path stay the same.
+    """
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(app_module, "PASSWORD_HASH_METHOD", "scrypt:1024:8:1")
+        yield
+
+
+@pytest.fixture(autouse=True)
+def fast_mongo(monkeypatch):
+    """
+    Cap server selection at 1 ms for any real MongoClient a test creates.
+
+    A test that reaches the real client then fails straight away instead of
+    waiting out the app's 2 s server selection timeout.
+    """
+
+    def fast_client(*args, **kwargs):
+        return pymongo.MongoClient(*args, **{**kwargs, "serverSelectionTimeoutMS": 1})
+
+    monkeypatch.setattr(app_module, "MongoClient", fast_client)
+    get_db = app_module.get_db
+    get_db.cache_clear()
+    yield
+    get_db.cache_clear()
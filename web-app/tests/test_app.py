@@ -1,31 +1,31 @@
 """Tests for the Flask app and MongoDB handler using mongomock."""
 
 # pylint: skip-file
+import io
 import os
 import sys
-from unittest.mock import patch
+import uuid
+from unittest.mock import Mock
 import mongomock
 import pytest
+from pymongo.errors import DuplicateKeyError
 from werkzeug.security import generate_password_hash
-from unittest.mock import patch
 from bson.objectid import ObjectId
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 from app import app as flask_app
 import app as app_module
 
-patch("os.makedirs").start()
 
+@pytest.fixture(scope="module")
+def mock_client():
+    """Provides one in-memory MongoDB client shared by the module's tests."""
+    return mongomock.MongoClient()
 
-@pytest.fixture
-def client(monkeypatch):
-    """Provides a Flask test client with mocked MongoDB collections."""
-
-    mock_client = mongomock.MongoClient()
-    mock_db = mock_client["whos_that_animal"]
-    monkeypatch.setattr(app_module, "users_collection", mock_db["users"])
-    monkeypatch.setattr(app_module, "photos_collection", mock_db["photos"])
 
+@pytest.fixture(scope="session")
+def flask_client():
+    """Provides one Flask test client for the whole session."""
     flask_app.config.update(
         {"TESTING": True, "WTF_CSRF_ENABLED": False, "SECRET_KEY": "test_secret"}
     )
@@ -34,21 +34,51 @@ def client(monkeypatch):
         yield test_client
 
 
-def test_style_css_served(client, monkeypatch, tmp_path):
-    """Covers /style.css route including successful file read."""
+@pytest.fixture
+def client(monkeypatch, mock_client, flask_client):
+    """Provides the logged-out test client with its own mocked MongoDB database."""
+
+    db_name = f"db_{uuid.uuid4().hex}"
+    mock_db = mock_client[db_name]
+    monkeypatch.setattr(app_module, "get_db", lambda: mock_db)
+    # Drop the login left behind by the previous test
+    flask_client.delete_cookie(flask_app.config["SESSION_COOKIE_NAME"])
+
+    yield flask_client
+    mock_client.drop_database(db_name)
+
+
+def test_get_db_creates_indexes(monkeypatch):
+    """get_db() builds the indexes and the capped photo_jobs collection."""
+    mongo_client = Mock(wraps=mongomock.MongoClient)
+    monkeypatch.setattr(app_module, "MongoClient", mongo_client)
+    # mongomock has no capped collections, so only the call is checked
+    create_collection = Mock()
+    monkeypatch.setattr(
+        mongomock.database.Database, "create_collection", create_collection
+    )
 
-    fake_templates = tmp_path / "templates"
-    fake_templates.mkdir()
-    css_file = fake_templates / "styles.css"
-    css_file.write_text("body { background: black; }")
+    db = app_module.get_db()
+
+    photo_indexes = db["photos"].index_information()
+    assert photo_indexes["user_recent"]["key"] == [("user_id", 1), ("created_at", -1)]
+    assert db["users"].index_information()["username_unique"]["unique"] is True
+    assert app_module.get_db() is db
+    mongo_client.assert_called_once()
+    assert mongo_client.call_args.kwargs["maxPoolSize"] == 20
+    assert mongo_client.call_args.kwargs["connect"] is False
+    create_collection.assert_called_once_with(
+        "photo_jobs", capped=True, size=app_module.PHOTO_JOBS_SIZE
+    )
 
-    monkeypatch.setattr(app_module.app, "root_path", str(tmp_path))
 
-    resp = client.get("/style.css")
+def test_style_css_served(client):
+    """The stylesheet is served from static/ by Flask's static route."""
+    resp = client.get("/static/style.css")
 
     assert resp.status_code == 200
-    assert b"background" in resp.data
-    assert resp.headers["Content-Type"] == "text/css"
+    assert resp.mimetype == "text/css"
+    resp.close()
 
 
 def test_register_and_login(client):
@@ -76,6 +106,9 @@ def test_register_and_login(client):
     )
     assert b"Account created!" not in response.data
 
+    user = app_module.get_db()["users"].find_one({"username": "testuser"})
+    assert user["email"] == "test@example.com"
+
 
 def test_protected_route_requires_login(client):
     """Index route should require login."""
@@ -85,12 +118,14 @@ def test_protected_route_requires_login(client):
 
 def test_user_in_db(client):
     """Direct database insertion works as expected."""
-    users_collection = app_module.users_collection
+    users_collection = app_module.get_db()["users"]
     users_collection.insert_one(
         {
             "username": "mongo_user",
             "email": "mongo@example.com",
-            "password_hash": generate_password_hash("pw"),
+            "password_hash": generate_password_hash(
+                "pw", app_module.PASSWORD_HASH_METHOD
+            ),
         }
     )
 
@@ -129,6 +164,22 @@ def test_logout_route(client):
     assert b"login" in resp.data.lower()
 
 
+def test_load_user_cached_between_requests(client, monkeypatch):
+    """Repeat requests within USER_CACHE_TTL reuse the loaded user."""
+    register_and_login(client)
+    users = app_module.get_db()["users"]
+    find_one = Mock(wraps=users.find_one)
+    monkeypatch.setattr(users, "find_one", find_one)
+    app_module._user_cache.clear()
+
+    client.get("/")
+    client.get("/")
+    assert find_one.call_count == 1
+
+    client.get("/logout")
+    assert client.get("/").status_code == 302
+
+
 def test_home_page_authenticated(client):
     """Covers home() route."""
     register_and_login(client)
@@ -151,3 +202,198 @@ def test_upload_get_page(client):
     register_and_login(client)
     resp = client.get("/upload")
     assert resp.status_code == 200
+
+
+def test_my_animals_paginates(client):
+    """Covers /my_animals paging through more photos than fit on one page."""
+    register_and_login(client)
+    db = app_module.get_db()
+    user = db["users"].find_one({"username": "u1"})
+    db["photos"].insert_many(
+        {
+            "user_id": user["_id"],
+            "filename": f"{i}.jpg",
+            "filepath": f"/uploads/{i}.jpg",
+            "status": "pending",
+            "created_at": i,
+        }
+        for i in range(app_module.MY_ANIMALS_PAGE_SIZE + 1)
+    )
+
+    first = client.get("/my_animals")
+    assert first.data.count(b"Processing...") == app_module.MY_ANIMALS_PAGE_SIZE
+    assert b"Older" in first.data and b"Newer" not in first.data
+
+    second = client.get("/my_animals?page=1")
+    assert second.data.count(b"Processing...") == 1
+    assert b"0.jpg" in second.data
+    oldest = db["photos"].find_one({"created_at": 0})
+    assert f'/my_animal/{oldest["_id"]}"'.encode() in second.data
+    assert b"Newer" in second.data and b"Older" not in second.data
+
+
+def test_register_race_reports_name_taken(client, monkeypatch):
+    """A concurrent registration of the same name is reported, not a 500."""
+    users = app_module.get_db()["users"]
+    monkeypatch.setattr(
+        users, "update_one", Mock(side_effect=DuplicateKeyError("username_unique"))
+    )
+
+    resp = client.post(
+        "/register",
+        data={"username": "racer", "email": "r@e.com", "password": "pw"},
+    )
+
+    assert resp.status_code == 200
+    with client.session_transaction() as session:
+        (flashed,) = session["_flashes"]
+    assert "already taken" in flashed[1]
+
+
+def test_register_stores_password_hash(client):
+    """Passwords are stored hashed and checked against the hash on login."""
+    register_and_login(client, username="hashed")
+    user = app_module.get_db()["users"].find_one({"username": "hashed"})
+    assert "password" not in user
+    assert user["password_hash"] != "pw"
+
+    client.get("/logout")
+    resp = client.post("/login", data={"username": "hashed", "password": "wrong"})
+    # A failed login re-renders the form instead of redirecting home
+    assert resp.status_code == 200
+
+
+def test_login_upgrades_plaintext_password(client):
+    """A legacy plain-text password still logs in and is replaced by a hash."""
+    users = app_module.get_db()["users"]
+    users.insert_one({"username": "legacy", "email": "l@e.com", "password": "pw"})
+
+    resp = client.post("/login", data={"username": "legacy", "password": "pw"})
+    assert resp.status_code == 302
+
+    user = users.find_one({"username": "legacy"})
+    assert "password" not in user
+    assert user["password_hash"] != "pw"
+
+
+def test_login_plaintext_password_non_ascii(client):
+    """A non-ASCII password is checked against a legacy account, not a 500."""
+    users = app_module.get_db()["users"]
+    users.insert_one({"username": "legacy", "email": "l@e.com", "password": "pw"})
+
+    resp = client.post("/login", data={"username": "legacy", "password": "pässwort"})
+    assert resp.status_code == 200
+
+    users.update_one({"username": "legacy"}, {"$set": {"password": "pässwort"}})
+    resp = client.post("/login", data={"username": "legacy", "password": "pässwort"})
+    assert resp.status_code == 302
+
+
+def test_login_rehashes_old_hash_method(client):
+    """A password hashed with an older method is rehashed with scrypt on login."""
+    users = app_module.get_db()["users"]
+    old_hash = generate_password_hash("pw", "pbkdf2:sha256:1000")
+    users.insert_one({"username": "old", "email": "o@e.com", "password_hash": old_hash})
+
+    resp = client.post("/login", data={"username": "old", "password": "pw"})
+    assert resp.status_code == 302
+
+    new_hash = users.find_one({"username": "old"})["password_hash"]
+    assert new_hash.startswith(app_module.PASSWORD_HASH_METHOD + "$")
+
+
+def test_upload_saves_file_and_queues_photo(client, monkeypatch, tmp_path):
+    """Covers POST /upload writing the file and inserting a pending photo."""
+    monkeypatch.setattr(app_module, "UPLOAD_FOLDER", str(tmp_path))
+    register_and_login(client)
+
+    resp = client.post(
+        "/upload",
+        data={"image": (io.BytesIO(b"fake image bytes"), "cat.jpg")},
+        content_type="multipart/form-data",
+    )
+    assert resp.status_code == 302
+
+    photo = app_module.get_db()["photos"].find_one({})
+    assert photo["status"] == "pending"
+    assert photo["filename"].endswith("_cat.jpg")
+    assert photo["created_at"] == photo["updated_at"]
+    with open(photo["filepath"], "rb") as saved:
+        assert saved.read() == b"fake image bytes"
+    assert os.listdir(tmp_path) == [photo["filename"]]
+    job = app_module.get_db()["photo_jobs"].find_one({})
+    assert job["photo_id"] == photo["_id"]
+
+
+def test_upload_copies_without_hard_links(client, monkeypatch, tmp_path):
+    """Uploads are copied into place where the disk refuses hard links."""
+    monkeypatch.setattr(app_module, "UPLOAD_FOLDER", str(tmp_path))
+    register_and_login(client)
+
+    def no_link(*args):
+        raise PermissionError("hard links not supported")
+
+    monkeypatch.setattr(app_module.os, "link", no_link)
+    client.post(
+        "/upload",
+        data={"image": (io.BytesIO(b"fake image bytes"), "cat.jpg")},
+        content_type="multipart/form-data",
+    )
+
+    photo = app_module.get_db()["photos"].find_one({})
+    with open(photo["filepath"], "rb") as saved:
+        assert saved.read() == b"fake image bytes"
+    assert os.listdir(tmp_path) == [photo["filename"]]
+
+
+def test_upload_too_large_rejected(client, monkeypatch, tmp_path):
+    """Uploads over MAX_CONTENT_LENGTH are refused before being saved."""
+    monkeypatch.setattr(app_module, "UPLOAD_FOLDER", str(tmp_path))
+    register_and_login(client)
+    monkeypatch.setitem(flask_app.config, "MAX_CONTENT_LENGTH", 8)
+
+    resp = client.post(
+        "/upload",
+        data={"image": (io.BytesIO(b"more than eight bytes"), "cat.jpg")},
+        content_type="multipart/form-data",
+    )
+    assert resp.status_code == 413
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_style_css_conditional_get(client):
+    """A repeat stylesheet request with a matching ETag gets a 304."""
+    first = client.get("/static/style.css")
+    assert first.headers["Cache-Control"] == "public, max-age=3600"
+    first.close()
+
+    second = client.get(
+        "/static/style.css", headers={"If-None-Match": first.headers["ETag"]}
+    )
+    assert second.status_code == 304
+
+
+def test_uploaded_file_cached_as_immutable(client, monkeypatch, tmp_path):
+    """Uploads are served with a year-long immutable cache and answer 304s."""
+    (tmp_path / "cat.jpg").write_bytes(b"image")
+    monkeypatch.setattr(app_module, "UPLOAD_FOLDER", str(tmp_path))
+
+    first = client.get("/uploads/cat.jpg")
+    assert first.cache_control.max_age == app_module.UPLOAD_MAX_AGE
+    assert first.cache_control.immutable
+    first.close()
+
+    second = client.get(
+        "/uploads/cat.jpg", headers={"If-None-Match": first.headers["ETag"]}
+    )
+    assert second.status_code == 304
+
+
+def test_uploaded_file_x_sendfile(client, monkeypatch, tmp_path):
+    """With X-Sendfile enabled the proxy is told which file to send."""
+    (tmp_path / "cat.jpg").write_bytes(b"image")
+    monkeypatch.setattr(app_module, "UPLOAD_FOLDER", str(tmp_path))
+    monkeypatch.setitem(flask_app.config, "USE_X_SENDFILE", True)
+
+    resp = client.get("/uploads/cat.jpg")
+    assert resp.headers["X-Sendfile"] == str(tmp_path / "cat.jpg")